@@ -1,6 +1,8 @@
 from __future__ import annotations
 
-from typing import MutableMapping
+import re
+from functools import lru_cache
+from typing import Iterator, MutableMapping
 
 from sql_metadata import Parser, QueryType  # type: ignore
 
@@ -88,7 +90,7 @@ def get_ro_node_connection(
 ) -> ClickhousePool:
     storage = _get_storage(storage_name)
 
-    key = f"{storage.get_storage_key()}-{clickhouse_host}"
+    key = f"{storage.get_storage_key()}-{clickhouse_host}-{client_settings.name}"
     if key in NODE_CONNECTIONS:
         return NODE_CONNECTIONS[key]
 
@@ -129,14 +131,20 @@ def get_ro_node_connection(
     return connection
 
 
-CLUSTER_CONNECTIONS: MutableMapping[str, ClickhousePool] = {}
+# Connections are kept for the lifetime of the process, keyed by storage and
+# client settings, since each settings value implies its own user and query
+# settings (e.g. TRACING uses the trace user).
+CLUSTER_CONNECTIONS: MutableMapping[
+    tuple[str, ClickhouseClientSettings], ClickhousePool
+] = {}
 
 
 def get_ro_query_node_connection(
     storage_name: str, client_settings: ClickhouseClientSettings
 ) -> ClickhousePool:
-    if storage_name in CLUSTER_CONNECTIONS:
-        return CLUSTER_CONNECTIONS[storage_name]
+    key = (storage_name, client_settings)
+    if key in CLUSTER_CONNECTIONS:
+        return CLUSTER_CONNECTIONS[key]
 
     storage = _get_storage(storage_name)
     cluster = storage.get_cluster()
@@ -145,7 +153,7 @@ def get_ro_query_node_connection(
         connection_id.hostname, connection_id.tcp_port, storage_name, client_settings
     )
 
-    CLUSTER_CONNECTIONS[storage_name] = connection
+    CLUSTER_CONNECTIONS[key] = connection
     return connection
 
 
@@ -179,6 +187,53 @@ def get_sudo_node_connection(
     return connection
 
 
+MAX_RO_QUERY_LENGTH = 64 * 1024
+
+DISALLOWED_TOKENS = frozenset(
+    {
+        ";",
+        "alter",
+        "attach",
+        "delete",
+        "drop",
+        "insert",
+        "optimize",
+        "truncate",
+        "update",
+    }
+)
+
+# Comments and quoted literals/identifiers are matched as whole tokens so
+# that their contents are never mistaken for keywords. Unterminated ones run
+# to the end of the query.
+QUERY_TOKEN_RE = re.compile(
+    r"""
+    (?P<comment>--[^\n]*|/\*.*?(?:\*/|\Z))
+    |(?P<quoted>
+        '(?:[^'\\]|\\.|'')*(?:'|\Z)
+        |"(?:[^"\\]|\\.|"")*(?:"|\Z)
+        |`(?:[^`\\]|\\.|``)*(?:`|\Z)
+    )
+    |(?P<word>[a-z_][a-z0-9_]*)
+    |(?P<semicolon>;)
+    """,
+    re.ASCII | re.DOTALL | re.IGNORECASE | re.VERBOSE,
+)
+
+
+def _tokenize(sql_query: str) -> Iterator[str]:
+    """
+    Yields the lowercased keywords/identifiers and semicolons of a query in
+    a single pass, skipping comments and quoted literals/identifiers.
+    """
+    for match in QUERY_TOKEN_RE.finditer(sql_query):
+        kind = match.lastgroup
+        if kind == "word":
+            yield match.group().lower()
+        elif kind == "semicolon":
+            yield ";"
+
+
 def validate_ro_query(sql_query: str, allowed_tables: set[str] | None = None) -> None:
     """
     Simple validation to ensure query only attempts read queries.
@@ -188,14 +243,29 @@ def validate_ro_query(sql_query: str, allowed_tables: set[str] | None = None) ->
 
     Raises InvalidCustomQuery if query is invalid or not allowed.
     """
-    lowered = sql_query.lower()
-    disallowed_keywords = ["insert", ";"]
+    # Checked first, so pathological inputs are rejected before they are
+    # tokenized or parsed.
+    if len(sql_query) > MAX_RO_QUERY_LENGTH:
+        raise InvalidCustomQuery(
+            f"Query is too long, the maximum length is {MAX_RO_QUERY_LENGTH} characters"
+        )
+
+    _validate_ro_query(
+        sql_query, frozenset(allowed_tables) if allowed_tables is not None else None
+    )
+
 
-    for kw in disallowed_keywords:
-        if kw in lowered:
-            raise InvalidCustomQuery(f"{kw} is not allowed in the query")
+# Admin tools tend to replay the same few queries, so successful validations
+# are cached. Failures raise and are therefore never cached.
+@lru_cache(maxsize=256)
+def _validate_ro_query(sql_query: str, allowed_tables: frozenset[str] | None) -> None:
+    for token in _tokenize(sql_query):
+        if token in DISALLOWED_TOKENS:
+            raise InvalidCustomQuery(f"{token} is not allowed in the query")
 
-    parsed = Parser(lowered)
+    # The parser is only handed a lowercased copy so that table names are
+    # matched case-insensitively against allowed_tables.
+    parsed = Parser(sql_query.lower())
 
     if parsed.query_type != QueryType.SELECT:
         raise InvalidCustomQuery("Only SELECT queries are allowed")
@@ -222,7 +292,7 @@ def validate_ro_query(sql_query: str, allowed_tables: set[str] | None = None) ->
 
     if allowed_tables and not tables_set.issubset(allowed_tables):
         raise InvalidCustomQuery(
-            f"Invalid FROM clause, only the following tables are allowed: {allowed_tables}"
+            f"Invalid FROM clause, only the following tables are allowed: {set(allowed_tables)}"
         )
 
 
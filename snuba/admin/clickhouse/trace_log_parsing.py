@@ -2,7 +2,7 @@ from __future__ import annotations
 
 import re
 from dataclasses import dataclass
-from typing import Any
+from typing import Any, Iterator
 
 # [ spans-clickhouse-1 ] [ 65011 ] {0.21246445055947638} <Debug> default.spans_optimized_v2_traces (aacb1a4f-32d0-49ea-8985-9c0d92a079ae) (SelectExecutor): Index `bf_attr_str_5` has dropped 0/2199 granules.
 INDEX_MATCHER_RE = re.compile(
@@ -211,17 +211,12 @@ line_types = [
 
 
 def summarize_trace_output(raw_trace_logs: str) -> TracingSummary:
-    parsed = format_log_to_dict(raw_trace_logs)
-
     summary = TracingSummary({})
-    query_node = parsed[0]["node_name"]
-    summary.query_summaries[query_node] = QuerySummary(
-        query_node, True, parsed[0]["query_id"]
-    )
-    for line in parsed:
+    for line in iter_formatted_logs(raw_trace_logs):
         if line["node_name"] not in summary.query_summaries:
+            # The first node to log is the one the query was sent to.
             summary.query_summaries[line["node_name"]] = QuerySummary(
-                line["node_name"], False, line["query_id"]
+                line["node_name"], not summary.query_summaries, line["query_id"]
             )
 
         query_summary = summary.query_summaries[line["node_name"]]
@@ -245,8 +240,15 @@ curly_re = re.compile(r"{.*?}")
 
 
 def format_log_to_dict(raw_trace_logs: str) -> list[dict[str, Any]]:
+    return list(iter_formatted_logs(raw_trace_logs))
+
+
+def iter_formatted_logs(raw_trace_logs: str) -> Iterator[dict[str, Any]]:
+    """
+    Parses trace log lines one at a time, so callers that only aggregate over
+    the trace never hold every parsed line in memory at once.
+    """
     # CLICKHOUSE TRACING LOG STRUCTURE: '[ NODE ] [ THREAD_ID ] {QUERY_ID} <LOG_TYPE> LOG_LINE'
-    formatted_logs = []
     for line in raw_trace_logs.splitlines():
         context = square_re.findall(line)
         log_type = ""
@@ -267,9 +269,8 @@ def format_log_to_dict(raw_trace_logs: str) -> list[dict[str, Any]]:
                 "log_type": log_type,
                 "log_content": angle_re.split(line)[1].strip(),
             }
-            formatted_logs.append(formatted_log)
         except Exception:
             # Error parsing log line, continue.
-            pass
+            continue
 
-    return formatted_logs
+        yield formatted_log
@@ -0,0 +1,28 @@
+from __future__ import annotations
+
+from typing import Any
+
+import rapidjson
+from flask.json.provider import DefaultJSONProvider
+
+
+class RapidJSONProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider backed by rapidjson, which encodes the large
+    responses of the admin tools (query results, traces) several times
+    faster than the standard library. Types rapidjson can't encode go
+    through Flask's default conversions, so responses are unchanged.
+    """
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        # rapidjson output is always compact, it has no separators option.
+        kwargs.pop("separators", None)
+        kwargs.setdefault("default", self.default)
+        kwargs.setdefault("ensure_ascii", self.ensure_ascii)
+        kwargs.setdefault("sort_keys", self.sort_keys)
+        kwargs.setdefault("number_mode", rapidjson.NM_NAN)
+        return str(rapidjson.dumps(obj, **kwargs))
+
+    def loads(self, s: str | bytes, **kwargs: Any) -> Any:
+        kwargs.setdefault("number_mode", rapidjson.NM_NAN)
+        return rapidjson.loads(s, **kwargs)
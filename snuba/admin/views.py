@@ -40,6 +40,7 @@ from snuba.admin.clickhouse.system_queries import (
 from snuba.admin.clickhouse.trace_log_parsing import summarize_trace_output
 from snuba.admin.clickhouse.tracing import TraceOutput, run_query_and_get_trace
 from snuba.admin.dead_letter_queue import get_dlq_topics
+from snuba.admin.json_provider import RapidJSONProvider
 from snuba.admin.kafka.topics import get_broker_data
 from snuba.admin.migrations_policies import (
     check_migration_perms,
@@ -101,6 +102,7 @@ from snuba.web.views import dataset_query
 logger = structlog.get_logger().bind(module=__name__)
 
 application = Flask(__name__, static_url_path="/static", static_folder="dist")
+application.json = RapidJSONProvider(application)
 
 runner = Runner()
 audit_log = AuditLog()
@@ -52,7 +52,7 @@ class OrderBy:
     expression: Expression
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class SelectedExpression:
     # The name of this column in the resultset.
     # TODO: Make this non nullable
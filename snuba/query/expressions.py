@@ -19,7 +19,7 @@ _AUTO_REPR = not settings.PRETTY_FORMAT_EXPRESSIONS
 
 
 # This is a workaround for a mypy bug, found here: https://github.com/python/mypy/issues/5374
-@dataclass(frozen=True, repr=_AUTO_REPR)
+@dataclass(frozen=True, repr=_AUTO_REPR, slots=True)
 class _Expression:
     # TODO: Make it impossible to assign empty string as an alias.
     alias: Optional[str]
@@ -35,6 +35,10 @@ class Expression(_Expression, ABC):
     All expressions can have an optional alias.
     """
 
+    # Keep the concrete expressions free of a per-instance __dict__, as
+    # queries allocate a large number of them.
+    __slots__ = ()
+
     @abstractmethod
     def transform(self, func: Callable[[Expression], Expression]) -> Expression:
         """
@@ -291,7 +295,7 @@ class ColumnVisitor(ExpressionVisitor[set[str]]):
 OptionalScalarType = Union[None, bool, str, float, int, date, datetime]
 
 
-@dataclass(frozen=True, repr=_AUTO_REPR)
+@dataclass(frozen=True, repr=_AUTO_REPR, slots=True)
 class Literal(Expression):
     """
     A literal in the SQL expression
@@ -314,7 +318,7 @@ class Literal(Expression):
         return self.value == other.value
 
 
-@dataclass(frozen=True, repr=_AUTO_REPR)
+@dataclass(frozen=True, repr=_AUTO_REPR, slots=True)
 class Column(Expression):
     """
     Represent a column in the schema of the dataset.
@@ -341,7 +345,7 @@ class Column(Expression):
         )
 
 
-@dataclass(frozen=True, repr=_AUTO_REPR)
+@dataclass(frozen=True, repr=_AUTO_REPR, slots=True)
 class SubscriptableReference(Expression):
     """
     Accesses one entry of a subscriptable column (for example key based access on
@@ -387,7 +391,7 @@ class SubscriptableReference(Expression):
         )
 
 
-@dataclass(frozen=True, repr=_AUTO_REPR)
+@dataclass(frozen=True, repr=_AUTO_REPR, slots=True)
 class FunctionCall(Expression):
     """
     Represents an expression that resolves to a function call on Clickhouse.
@@ -450,7 +454,7 @@ class FunctionCall(Expression):
         return True
 
 
-@dataclass(frozen=True, repr=_AUTO_REPR)
+@dataclass(frozen=True, repr=_AUTO_REPR, slots=True)
 class CurriedFunctionCall(Expression):
     """
     This function call represent a function with currying: f(x)(y).
@@ -509,7 +513,7 @@ class CurriedFunctionCall(Expression):
         return True
 
 
-@dataclass(frozen=True, repr=_AUTO_REPR)
+@dataclass(frozen=True, repr=_AUTO_REPR, slots=True)
 class Argument(Expression):
     """
     A bound variable in a lambda expression. This is used to refer to variables
@@ -533,7 +537,7 @@ class Argument(Expression):
         return self.name == other.name
 
 
-@dataclass(frozen=True, repr=_AUTO_REPR)
+@dataclass(frozen=True, repr=_AUTO_REPR, slots=True)
 class Lambda(Expression):
     """
     A lambda expression in the form (x,y,z -> transform(x,y,z))
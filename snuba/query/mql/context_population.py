@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+from functools import lru_cache, partial
+
 from snuba_sdk.metrics_visitors import AGGREGATE_ALIAS
 
 from snuba.datasets.entities.entity_key import EntityKey
@@ -18,6 +20,25 @@ from snuba.util import parse_datetime
 from snuba.utils.constants import GRANULARITIES_AVAILABLE
 
 
+# Builds Literal(None, value), for mapping over the scope ids.
+_unaliased_literal = partial(Literal, None)
+
+
+@lru_cache(maxsize=256)
+def context_column(table_name: str | None, column_name: str) -> Column:
+    """
+    Columns are immutable and a query only ever references a handful of
+    table aliases, so the columns added from the MQL context are shared.
+    """
+    return Column(None, table_name, column_name)
+
+
+@lru_cache(maxsize=64)
+def _time_column(entity_key: EntityKey, table_name: str | None) -> Column:
+    entity = get_entity(entity_key)
+    return context_column(table_name, entity.required_time_column or "timestamp")
+
+
 def start_end_time_condition(
     mql_context: MQLContext, entity_key: EntityKey, table_name: str | None = None
 ) -> Expression:
@@ -27,22 +48,19 @@ def start_end_time_condition(
     except Exception as e:
         raise ParsingException("Invalid start or end time") from e
 
-    entity = get_entity(entity_key)
-    required_timestamp_column = (
-        entity.required_time_column if entity.required_time_column else "timestamp"
-    )
+    time_column = _time_column(entity_key, table_name)
     filters = []
     filters.append(
         binary_condition(
             ConditionFunctions.GTE,
-            Column(None, table_name, column_name=required_timestamp_column),
+            time_column,
             Literal(None, value=start),
         ),
     )
     filters.append(
         binary_condition(
             ConditionFunctions.LT,
-            Column(None, table_name, column_name=required_timestamp_column),
+            time_column,
             Literal(None, value=end),
         ),
     )
@@ -56,40 +74,53 @@ def scope_conditions(
     filters.append(
         binary_condition(
             ConditionFunctions.IN,
-            Column(None, table_name, "project_id"),
+            context_column(table_name, "project_id"),
             FunctionCall(
                 None,
                 "tuple",
-                tuple(
-                    Literal(None, project_id)
-                    for project_id in mql_context.scope.project_ids
-                ),
+                tuple(map(_unaliased_literal, mql_context.scope.project_ids)),
             ),
         )
     )
     filters.append(
         binary_condition(
             ConditionFunctions.IN,
-            Column(None, table_name, "org_id"),
+            context_column(table_name, "org_id"),
             FunctionCall(
                 None,
                 "tuple",
-                tuple(
-                    Literal(None, int(org_id)) for org_id in mql_context.scope.org_ids
-                ),
+                tuple(map(_unaliased_literal, map(int, mql_context.scope.org_ids))),
             ),
         )
     )
     filters.append(
         binary_condition(
             ConditionFunctions.EQ,
-            Column(None, table_name, "use_case_id"),
+            context_column(table_name, "use_case_id"),
             Literal(None, mql_context.scope.use_case_id),
         )
     )
     return combine_and_conditions(filters)
 
 
+@lru_cache(maxsize=256)
+def _time_interval_expression(interval: int, table_name: str | None) -> FunctionCall:
+    prefix = "" if not table_name else f"{table_name}."
+    return FunctionCall(
+        f"{prefix}time",
+        "toStartOfInterval",
+        parameters=(
+            context_column(table_name, "timestamp"),
+            FunctionCall(
+                None,
+                "toIntervalSecond",
+                (Literal(None, interval),),
+            ),
+            Literal(None, "Universal"),
+        ),
+    )
+
+
 def rollup_expressions(
     mql_context: MQLContext, table_name: str | None = None
 ) -> tuple[Expression, bool, OrderBy | None, SelectedExpression | None]:
@@ -110,7 +141,7 @@ def rollup_expressions(
 
     granularity_condition = binary_condition(
         ConditionFunctions.EQ,
-        Column(None, table_name, "granularity"),
+        context_column(table_name, "granularity"),
         Literal(None, rollup.granularity),
     )
 
@@ -136,20 +167,7 @@ def rollup_expressions(
     if rollup.interval:
         # If an interval is specified, then we need to group the time by that interval,
         # return the time in the select, and order the results by that time.
-        prefix = "" if not table_name else f"{table_name}."
-        time_expression = FunctionCall(
-            f"{prefix}time",
-            "toStartOfInterval",
-            parameters=(
-                Column(None, table_name, "timestamp"),
-                FunctionCall(
-                    None,
-                    "toIntervalSecond",
-                    (Literal(None, rollup.interval),),
-                ),
-                Literal(None, "Universal"),
-            ),
-        )
+        time_expression = _time_interval_expression(rollup.interval, table_name)
         selected_time = SelectedExpression("time", time_expression)
         orderby = OrderBy(OrderByDirection.ASC, time_expression)
     elif rollup.orderby is not None:
@@ -161,22 +179,19 @@ def rollup_expressions(
     return granularity_condition, with_totals, orderby, selected_time
 
 
-def limit_value(mql_context: MQLContext) -> int:
-    limit = 1000
-    if mql_context.limit:
-        if mql_context.limit > MAX_LIMIT:
-            raise ParsingException(
-                "queries cannot have a limit higher than 10000", should_report=False
-            )
-        limit = mql_context.limit
-
-    return limit
-
+def limit_offset_values(mql_context: MQLContext) -> tuple[int, int | None]:
+    """
+    Validates the limit and offset of the MQL context and returns them, with
+    the default limit applied.
+    """
+    limit = mql_context.limit or 1000
+    if limit > MAX_LIMIT:
+        raise ParsingException(
+            "queries cannot have a limit higher than 10000", should_report=False
+        )
 
-def offset_value(mql_context: MQLContext) -> int | None:
-    if mql_context.offset:
-        if mql_context.offset < 0:
-            raise ParsingException("offset must be greater than or equal to 0")
-        return mql_context.offset
+    offset = mql_context.offset or None
+    if offset is not None and offset < 0:
+        raise ParsingException("offset must be greater than or equal to 0")
 
-    return None
+    return limit, offset
@@ -1,12 +1,32 @@
 from __future__ import annotations
 
 import logging
+from collections import defaultdict
+from contextlib import nullcontext
 from dataclasses import dataclass, replace
-from typing import Any, Callable, Dict, Optional, Sequence, Tuple, Union
+from functools import lru_cache, partial
+from itertools import count
+from typing import (
+    Any,
+    Callable,
+    ContextManager,
+    Dict,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeGuard,
+    TypeVar,
+    Union,
+)
 
 import sentry_sdk
-from parsimonious.exceptions import IncompleteParseError
+from parsimonious.exceptions import (
+    IncompleteParseError,
+    UndefinedLabel,
+    VisitationError,
+)
 from parsimonious.nodes import Node, NodeVisitor
+from sentry_sdk.tracing_utils import has_tracing_enabled
 from snuba_sdk import BooleanCondition, Condition
 from snuba_sdk.metrics_visitors import AGGREGATE_ALIAS
 from snuba_sdk.mql.mql import MQL_GRAMMAR
@@ -50,8 +70,8 @@ from snuba.query.indexer.resolver import resolve_mappings
 from snuba.query.logical import EntityQuery
 from snuba.query.logical import Query as LogicalQuery
 from snuba.query.mql.context_population import (
-    limit_value,
-    offset_value,
+    context_column,
+    limit_offset_values,
     rollup_expressions,
     scope_conditions,
     start_end_time_condition,
@@ -78,11 +98,11 @@ MQLSTUFF = Dict[str, Union[str, list[SelectedExpression], list[Expression]]]
 logger = logging.getLogger("snuba.mql.parser")
 
 
-@dataclass
+@dataclass(slots=True)
 class InitialParseResult:
     expression: SelectedExpression | None = None
     formula: str | None = None
-    parameters: list[FormulaParameter] | None = None
+    parameters: tuple[FormulaParameter, ...] = ()
     groupby: list[SelectedExpression] | None = None
     conditions: list[Expression] | None = None
     mri: str | None = None
@@ -91,6 +111,21 @@ class InitialParseResult:
 
 FormulaParameter = Union[InitialParseResult, int, float]
 
+T = TypeVar("T")
+
+
+def _extend(existing: list[T] | None, items: Sequence[T]) -> list[T]:
+    """
+    Extends the list in place rather than concatenating into a new one. A new
+    list is created the first time, so the same groupby list pushed down to
+    several leaves is never shared between them.
+    """
+    if existing is None:
+        return list(items)
+    existing.extend(items)
+    return existing
+
+
 ARITHMETIC_OPERATORS_MAPPING = {
     "+": "plus",
     "-": "minus",
@@ -102,14 +137,80 @@ UNARY_OPERATORS = {
     "-": "negate",
 }
 
+# Builds Literal(None, value). map() over this avoids a generator frame when
+# turning sequences of parameters into literals.
+_unaliased_literal = partial(Literal, None)
+
+
+def _unescape_quotes(text: str) -> str:
+    # Escaped quotes are rare in MQL strings, so skip the replace entirely
+    # for the common case.
+    return text.replace('\\"', '"') if '\\"' in text else text
+
+
+# Expressions are immutable, so every aggregate can share the same value column.
+_VALUE_COLUMN = Column(None, None, "value")
+
+# Condition functions used by filters, keyed by whether the filter is negated.
+LIKE_CONDITIONS = {
+    False: ConditionFunctions.LIKE,
+    True: ConditionFunctions.NOT_LIKE,
+}
+IN_CONDITIONS = {
+    False: ConditionFunctions.IN,
+    True: ConditionFunctions.NOT_IN,
+}
+EQ_CONDITIONS = {
+    False: ConditionFunctions.EQ,
+    True: ConditionFunctions.NEQ,
+}
+
 
 class MQLVisitor(NodeVisitor):  # type: ignore
     """
     Builds the arguments for a Snuba AST from the MQL Parsimonious parse tree.
     """
 
+    # Maps a grammar rule name to its visit_* method. Populated once, after
+    # the class is defined, so visit() does not need a getattr per node.
+    dispatch: dict[str, Callable[[MQLVisitor, Node, Sequence[Any]], Any]] = {}
+
     def __init__(self) -> None:
-        self.alias_count: dict[str, int] = {}
+        # One counter per MRI type, used to generate unique table aliases.
+        self.alias_counters: defaultdict[str, count[int]] = defaultdict(count)
+
+    def visit(self, node: Node) -> Any:
+        """
+        Same as NodeVisitor.visit, but walks the tree post-order with an
+        explicit stack instead of recursing, and dispatches through the
+        precomputed table instead of looking the method up by name on every
+        node. Deep queries therefore cannot hit the recursion limit.
+        """
+        # Each entry is a node and the results of its children visited so
+        # far, which is also the index of the next child to visit.
+        stack: list[tuple[Node, list[Any]]] = [(node, [])]
+        while True:
+            current, children = stack[-1]
+            if len(children) < len(current.children):
+                stack.append((current.children[len(children)], []))
+                continue
+
+            stack.pop()
+            method = self.dispatch.get(current.expr_name)
+            try:
+                if method is None:
+                    result = self.generic_visit(current, children)
+                else:
+                    result = method(self, current, children)
+            except (VisitationError, UndefinedLabel):
+                # Don't catch and re-wrap already-wrapped exceptions.
+                raise
+            except Exception as exc:
+                raise VisitationError(exc, type(exc), current) from exc
+
+            if not stack:
+                return result
+            stack[-1][1].append(result)
 
     def visit_expression(
         self,
@@ -125,7 +226,7 @@ class MQLVisitor(NodeVisitor):  # type: ignore
             return InitialParseResult(
                 expression=None,
                 formula=term_operator,
-                parameters=[term, coefficient],
+                parameters=(term, coefficient),
             )
         return term
 
@@ -146,9 +247,9 @@ class MQLVisitor(NodeVisitor):  # type: ignore
         term, zero_or_more_others = children
         if zero_or_more_others:
             _, term_operator, _, unary, *_ = zero_or_more_others[0]
-            parameters: list[FormulaParameter] = [term]
-            if unary is not None:
-                parameters.append(unary)
+            parameters: tuple[FormulaParameter, ...] = (
+                (term,) if unary is None else (term, unary)
+            )
 
             return InitialParseResult(
                 expression=None,
@@ -167,7 +268,7 @@ class MQLVisitor(NodeVisitor):  # type: ignore
                 return InitialParseResult(
                     expression=None,
                     formula=unary_op[0],
-                    parameters=[coefficient],
+                    parameters=(coefficient,),
                 )
             else:
                 raise InvalidQueryException(
@@ -199,6 +300,9 @@ class MQLVisitor(NodeVisitor):  # type: ignore
         ],
     ) -> InitialParseResult:
         target, filters, packed_groupbys, *_ = children
+        if not filters and not packed_groupbys:
+            return target
+
         new_condition = None
         packed_filters = filters[0][1] if filters else []  # strip braces
         if packed_filters:
@@ -215,54 +319,39 @@ class MQLVisitor(NodeVisitor):  # type: ignore
             if target.formula is not None:
                 # Push all the filters and groupbys of the formula down to all the leaf nodes
                 # so they get correctly added to their subqueries.
-                def pushdown_values(param: FormulaParameter) -> FormulaParameter:
+                to_visit = list(target.parameters)
+                while to_visit:
+                    param = to_visit.pop()
                     if not isinstance(param, InitialParseResult):
-                        return param
+                        continue
                     if param.formula is not None:
-                        parameters = param.parameters or []
-                        for p in parameters:
-                            pushdown_values(p)
+                        to_visit.extend(param.parameters)
                     elif param.expression is not None:
                         if new_condition:
-                            param.conditions = (
-                                param.conditions + [new_condition]
-                                if param.conditions
-                                else [new_condition]
+                            param.conditions = _extend(
+                                param.conditions, [new_condition]
                             )
                         if groupby:
-                            param.groupby = (
-                                param.groupby + groupby if param.groupby else groupby
-                            )
+                            param.groupby = _extend(param.groupby, groupby)
                     else:
                         raise InvalidQueryException("Could not parse formula")
-                    return param
-
-                for param in target.parameters or []:
-                    pushdown_values(param)
             else:
                 if new_condition:
-                    target.conditions = (
-                        target.conditions + [new_condition]
-                        if target.conditions
-                        else [new_condition]
-                    )
+                    target.conditions = _extend(target.conditions, [new_condition])
                 if groupby:
-                    target.groupby = (
-                        target.groupby + groupby if target.groupby else groupby
-                    )
+                    target.groupby = _extend(target.groupby, groupby)
         return target
 
     def _filter(self, children: Sequence[Any], operator: str) -> FunctionCall:
+        first: FunctionCall
         first, zero_or_more_others = children
-        filters: Sequence[FunctionCall] = [
-            first,
-            *(v for _, _, _, v in zero_or_more_others),
-        ]
-        if len(filters) == 1:
-            return filters[0]
-        else:
-            # We flatten all filters into a single condition since Snuba supports it.
-            return FunctionCall(None, operator, tuple(filters))
+        if not zero_or_more_others:
+            return first
+
+        # We flatten all filters into a single condition since Snuba supports it.
+        return FunctionCall(
+            None, operator, (first, *(v for _, _, _, v in zero_or_more_others))
+        )
 
     def visit_filter_expr(self, node: Node, children: Sequence[Any]) -> Any:
         return self._filter(children, BooleanFunctions.OR)
@@ -287,23 +376,16 @@ class MQLVisitor(NodeVisitor):  # type: ignore
         filter_factor_value: FilterFactorValue
 
         condition_op, lhs, _, _, _, filter_factor_value = factor  # type: ignore
-        condition_op_value = (
-            "!" if len(condition_op) == 1 and condition_op[0] == "!" else ""
-        )
+        negated = len(condition_op) == 1 and condition_op[0] == "!"
 
         contains_wildcard = filter_factor_value.contains_wildcard
         rhs = filter_factor_value.value
 
         if contains_wildcard and isinstance(rhs, str):
             rhs = rhs[:-1] + "%"
-            if not condition_op_value:
-                op = ConditionFunctions.LIKE
-            elif condition_op_value == "!":
-                op = ConditionFunctions.NOT_LIKE
-
             return FunctionCall(
                 None,
-                op,
+                LIKE_CONDITIONS[negated],
                 (
                     Column(None, None, lhs[0]),
                     Literal(None, rhs),
@@ -311,32 +393,23 @@ class MQLVisitor(NodeVisitor):  # type: ignore
             )
 
         if isinstance(rhs, list):
-            if not condition_op_value:
-                op = ConditionFunctions.IN
-            elif condition_op_value == "!":
-                op = ConditionFunctions.NOT_IN
-
             return FunctionCall(
                 None,
-                op,
+                IN_CONDITIONS[negated],
                 (
                     Column(None, None, lhs[0]),
                     FunctionCall(
                         None,
                         "tuple",
-                        tuple(Literal(None, value) for value in rhs),
+                        tuple(map(_unaliased_literal, rhs)),
                     ),
                 ),
             )
         else:
             assert isinstance(rhs, str)
-            if not condition_op_value:
-                op = ConditionFunctions.EQ
-            elif condition_op_value == "!":
-                op = ConditionFunctions.NEQ
             return FunctionCall(
                 None,
-                op,
+                EQ_CONDITIONS[negated],
                 (
                     Column(None, None, lhs[0]),
                     Literal(None, rhs),
@@ -388,12 +461,12 @@ class MQLVisitor(NodeVisitor):  # type: ignore
         return columns
 
     def visit_condition_op(self, node: Node, children: Sequence[Any]) -> str:
-        assert isinstance(node.text, str)
-        return node.text
+        text: str = node.text
+        return text
 
     def visit_tag_key(self, node: Node, children: Sequence[Any]) -> str:
-        assert isinstance(node.text, str)
-        return node.text
+        text: str = node.text
+        return text
 
     def visit_tag_value(
         self, node: Node, children: Sequence[FilterFactorValue]
@@ -418,23 +491,19 @@ class MQLVisitor(NodeVisitor):  # type: ignore
     def visit_quoted_string_filter(
         self, node: Node, children: Sequence[Any]
     ) -> FilterFactorValue:
-        text = str(node.text[1:-1])
-        match = text.replace('\\"', '"')
-        return FilterFactorValue(match, False)
+        return FilterFactorValue(_unescape_quotes(node.text[1:-1]), False)
 
     def visit_unquoted_string_filter(
         self, node: Node, children: Sequence[Any]
     ) -> FilterFactorValue:
-        return FilterFactorValue(str(node.text), False)
+        return FilterFactorValue(node.text, False)
 
     def visit_unquoted_string(self, node: Node, children: Sequence[Any]) -> str:
-        assert isinstance(node.text, str)
-        return str(node.text)
+        text: str = node.text
+        return text
 
     def visit_quoted_string(self, node: Node, children: Sequence[Any]) -> str:
-        assert isinstance(node.text, str)
-        match = str(node.text[1:-1]).replace('\\"', '"')
-        return match
+        return _unescape_quotes(node.text[1:-1])
 
     def visit_string_tuple(
         self, node: Node, children: Sequence[Any]
@@ -445,8 +514,8 @@ class MQLVisitor(NodeVisitor):  # type: ignore
         )
 
     def visit_group_by_name(self, node: Node, children: Sequence[Any]) -> str:
-        assert isinstance(node.text, str)
-        return node.text
+        text: str = node.text
+        return text
 
     def visit_group_by_name_tuple(
         self, node: Node, children: Sequence[Any]
@@ -494,7 +563,7 @@ class MQLVisitor(NodeVisitor):  # type: ignore
             expression=FunctionCall(
                 AGGREGATE_ALIAS,
                 function_name=aggregate_name,
-                parameters=tuple(Column(None, None, "value")),
+                parameters=(_VALUE_COLUMN,),
             ),
         )
         target.expression = selected_aggregate
@@ -520,11 +589,9 @@ class MQLVisitor(NodeVisitor):  # type: ignore
                 FunctionCall(
                     None,
                     aggregate_name,
-                    tuple(
-                        Literal(alias=None, value=param) for param in aggregate_params
-                    ),
+                    tuple(map(_unaliased_literal, aggregate_params)),
                 ),
-                (Column(None, None, "value"),),
+                (_VALUE_COLUMN,),
             ),
         )
         target.expression = selected_aggregate_column
@@ -587,9 +654,7 @@ class MQLVisitor(NodeVisitor):  # type: ignore
                 internal_function=FunctionCall(
                     None,
                     curried_arbitrary_function_name,
-                    tuple(
-                        Literal(alias=None, value=param) for param in aggregate_params
-                    ),
+                    tuple(map(_unaliased_literal, aggregate_params)),
                 ),
                 parameters=(
                     target.expression.expression,
@@ -646,41 +711,37 @@ class MQLVisitor(NodeVisitor):  # type: ignore
         return agg_params
 
     def visit_aggregate_name(self, node: Node, children: Sequence[Any]) -> str:
-        assert isinstance(node.text, str)
-        return node.text
+        text: str = node.text
+        return text
 
     def visit_curried_aggregate_name(self, node: Node, children: Sequence[Any]) -> str:
-        assert isinstance(node.text, str)
-        return node.text
+        text: str = node.text
+        return text
 
     def visit_arbitrary_function_name(self, node: Node, children: Sequence[Any]) -> str:
-        assert isinstance(node.text, str)
-        return node.text
+        text: str = node.text
+        return text
 
     def visit_curried_arbitrary_function_name(
         self, node: Node, children: Sequence[Any]
     ) -> str:
-        assert isinstance(node.text, str)
-        return node.text
+        text: str = node.text
+        return text
 
     def _generate_table_alias(self, mri: str) -> str:
         alias = mri[0]
-        suffix = self.alias_count.setdefault(alias, -1) + 1
-        self.alias_count[alias] = suffix
-        return f"{alias}{suffix}"
+        return f"{alias}{next(self.alias_counters[alias])}"
 
     def visit_quoted_mri(
         self, node: Node, children: Sequence[Any]
     ) -> InitialParseResult:
-        assert isinstance(node.text, str)
-        mri = str(node.text[1:-1])
+        mri: str = node.text[1:-1]
         return InitialParseResult(mri=mri, table_alias=self._generate_table_alias(mri))
 
     def visit_unquoted_mri(
         self, node: Node, children: Sequence[Any]
     ) -> InitialParseResult:
-        assert isinstance(node.text, str)
-        mri = str(node.text)
+        mri: str = node.text
         return InitialParseResult(mri=mri, table_alias=self._generate_table_alias(mri))
 
     def visit_quoted_public_name(
@@ -694,14 +755,34 @@ class MQLVisitor(NodeVisitor):  # type: ignore
         raise ParsingException("MQL endpoint only supports MRIs")
 
     def visit_identifier(self, node: Node, children: Sequence[Any]) -> str:
-        assert isinstance(node.text, str)
-        return node.text
+        text: str = node.text
+        return text
 
     def generic_visit(self, node: Node, children: Sequence[Any]) -> Any:
         """The generic visit method."""
         return children
 
 
+MQLVisitor.dispatch = {
+    name[len("visit_") :]: getattr(MQLVisitor, name)
+    for name in dir(MQLVisitor)
+    if name.startswith("visit_")
+}
+
+
+def _parse_mql(body: str) -> InitialParseResult:
+    exp_tree = MQL_GRAMMAR.parse(body)
+    parsed: InitialParseResult = MQLVisitor().visit(exp_tree)
+    return parsed
+
+
+# Dashboards and alerts send the same MQL bodies over and over, so the parse
+# results of reasonably sized bodies are cached. Since they are shared, the
+# cached InitialParseResults must never be mutated after parsing.
+MAX_CACHED_MQL_BODY_LENGTH = 16 * 1024
+_parse_mql_cached = lru_cache(maxsize=1024)(_parse_mql)
+
+
 def parse_mql_query_body(body: str, dataset: Dataset) -> EntityQuery:
     """
     Parse the MQL to create an initial query. Then augments that query using the context
@@ -715,15 +796,18 @@ def parse_mql_query_body(body: str, dataset: Dataset) -> EntityQuery:
             InitialParseResult(
                 'expression': SelectedExpression(name='aggregate_value', expression=sum(value) AS `sum(d:transactions/duration@millisecond)`),
                 'formula': None,
-                'parameters': None,
+                'parameters': (),
                 'groupby': [SelectedExpression(name='transaction', Column('transaction')],
                 'conditions': [in(Column('dist'), tuple('dist1', 'dist2'))],
                 'mri': 'd:transactions/duration@millisecond'
             )
         """
         try:
-            exp_tree = MQL_GRAMMAR.parse(body)
-            parsed: InitialParseResult = MQLVisitor().visit(exp_tree)
+            parsed = (
+                _parse_mql_cached(body)
+                if len(body) <= MAX_CACHED_MQL_BODY_LENGTH
+                else _parse_mql(body)
+            )
         except ParsingException as e:
             logger.warning(f"Invalid MQL query ({e}): {body}")
             raise e
@@ -778,22 +862,36 @@ def build_formula_query_from_clause(
     parsed: InitialParseResult, dataset: Dataset
 ) -> tuple[LogicalQuery | CompositeQuery[QueryEntity], list[InitialParseResult]]:
     def find_all_leaf_nodes(tree: FormulaParameter) -> list[InitialParseResult] | None:
-        if isinstance(tree, InitialParseResult) and tree.formula is None:
-            return [tree]
-        elif isinstance(tree, InitialParseResult) and tree.formula is not None:
-            nodes = []
-            for p in tree.parameters or []:
-                found = find_all_leaf_nodes(p)
-                if found:
-                    nodes.extend(found)
-            return nodes
-        else:
+        if not isinstance(tree, InitialParseResult):
             return None
 
+        # Depth-first, left to right: children are pushed in reverse so the
+        # leaves come out in the order they appear in the formula.
+        nodes = []
+        to_visit: list[FormulaParameter] = [tree]
+        while to_visit:
+            node = to_visit.pop()
+            if not isinstance(node, InitialParseResult):
+                continue
+            if node.formula is None:
+                nodes.append(node)
+            else:
+                to_visit.extend(reversed(node.parameters))
+        return nodes
+
     join_nodes = find_all_leaf_nodes(parsed)
     if join_nodes is None:
         raise InvalidQueryException("Could not parse formula")
 
+    if len(join_nodes) == 1:
+        # The query only has a single aggregation, so it's not necessary to build a join clause
+        # across entities.
+        entity_key = select_entity(join_nodes[0].mri or "", dataset)
+        return (
+            LogicalQuery(from_clause=get_query_entity(entity_key)),
+            join_nodes,
+        )
+
     # Since the groupby is used in the ON conditions, they should all the same.
     # However, we do support onesided groupbys in a formula. This is the time spent percentage use-case.
     # Example: sum(`transactions.duration`) by transaction / sum(`transactions.duration`)
@@ -806,68 +904,71 @@ def build_formula_query_from_clause(
                 )
 
     entity_keys = [select_entity(node.mri or "", dataset) for node in join_nodes]
-    if len(entity_keys) == 1:
-        # The query only has a single aggregation, so it's not necessary to build a join clause
-        # across entities.
-        entity_key = entity_keys.pop()
-        return (
-            LogicalQuery(
-                from_clause=QueryEntity(
-                    entity_key, get_entity(entity_key).get_data_model()
-                )
-            ),
-            join_nodes,
-        )
 
-    # Used to cache query entities to avoid building multiple times
-    entities: dict[EntityKey, QueryEntity] = {}
-
-    def build_node(node: InitialParseResult) -> IndividualNode[QueryEntity]:
+    def build_node(
+        node: InitialParseResult, entity_key: EntityKey
+    ) -> IndividualNode[QueryEntity]:
         if not node.mri:
             raise InvalidQueryException("No MRI found")
         if not node.table_alias:
             raise InvalidQueryException(f"No table alias found for MRI {node.mri}")
 
-        entity_key = select_entity(node.mri, dataset)
-        data_source = entities.setdefault(
-            entity_key, QueryEntity(entity_key, get_entity(entity_key).get_data_model())
-        )
-        return IndividualNode(node.table_alias, data_source)
+        return IndividualNode(node.table_alias, get_query_entity(entity_key))
 
-    # Build the JoinClause recursively, joining each node to the previous node.
+    # Build the JoinClause, joining each node to the previous node.
     # Note one thing: this assumes that each node has the same group by, which is enforced earlier.
-    first_node = build_node(join_nodes[0])
-
     def build_join_clause(
-        prev_node: IndividualNode[QueryEntity], nodes: list[InitialParseResult]
+        first_node: IndividualNode[QueryEntity],
+        nodes: list[tuple[InitialParseResult, EntityKey]],
     ) -> JoinClause[QueryEntity]:
         if not nodes:
             raise InvalidQueryException("Invalid join clause in formula query")
 
-        node = nodes[0]
-        if not node.table_alias:
-            raise InvalidQueryException("Invalid table alias in formula query")
-        lhs = build_node(node)
+        # Pair every node with the node before it, then nest the pairs so the
+        # last node ends up as the innermost left node.
+        joins: list[
+            tuple[
+                IndividualNode[QueryEntity],
+                IndividualNode[QueryEntity],
+                list[JoinCondition],
+            ]
+        ] = []
+        prev_node = first_node
+        for node, entity_key in nodes:
+            if not node.table_alias:
+                raise InvalidQueryException("Invalid table alias in formula query")
+            lhs = build_node(node, entity_key)
 
-        conditions = []
-        for groupby in node.groupby or []:
-            column = groupby.expression
-            assert isinstance(column, Column)
-            conditions.append(
-                JoinCondition(
-                    left=JoinConditionExpression(lhs.alias, column.column_name),
-                    right=JoinConditionExpression(prev_node.alias, column.column_name),
+            conditions = []
+            for groupby in node.groupby or []:
+                column = groupby.expression
+                assert isinstance(column, Column)
+                conditions.append(
+                    JoinCondition(
+                        left=JoinConditionExpression(lhs.alias, column.column_name),
+                        right=JoinConditionExpression(
+                            prev_node.alias, column.column_name
+                        ),
+                    )
                 )
+            joins.append((lhs, prev_node, conditions))
+            prev_node = lhs
+
+        left_side: IndividualNode[QueryEntity] | JoinClause[QueryEntity] = prev_node
+        for _, right_node, conditions in reversed(joins):
+            left_side = JoinClause(
+                left_node=left_side,
+                right_node=right_node,
+                keys=conditions,
+                join_type=JoinType.INNER,
             )
-        left_side = build_join_clause(lhs, nodes[1:]) if len(nodes) > 1 else lhs
-        return JoinClause(
-            left_node=left_side,
-            right_node=prev_node,
-            keys=conditions,
-            join_type=JoinType.INNER,
-        )
+        assert isinstance(left_side, JoinClause)
+        return left_side
 
-    join_clause = build_join_clause(first_node, join_nodes[1:])
+    # The entity of each leaf was already selected above, reuse it rather than
+    # parsing the MRIs again.
+    leaves = list(zip(join_nodes, entity_keys))
+    join_clause = build_join_clause(build_node(*leaves[0]), leaves[1:])
     return (
         CompositeQuery(
             from_clause=join_clause,
@@ -894,12 +995,15 @@ def convert_formula_to_query(
 
     query, nodes = build_formula_query_from_clause(parsed, dataset)
 
+    # Columns are only qualified with their table alias when the formula joins
+    # several entities.
+    is_join = not isinstance(query, LogicalQuery)
+
     def alias_wrap(alias: str | None) -> str | None:
-        return None if isinstance(query, LogicalQuery) else alias
+        return alias if is_join else None
 
-    # Build SelectedExpression from root tree
-    # When going through the selected expressions, populate the table aliases
-    def extract_expression(param: InitialParseResult | Any) -> Expression:
+    # Build the selected expression of a leaf, populating the table alias of its column
+    def extract_expression(param: InitialParseResult) -> Expression:
         match param:
             case InitialParseResult(
                 expression=SelectedExpression(
@@ -942,102 +1046,108 @@ def convert_formula_to_query(
                         for parameter in parameters
                     ),
                 )
-            case InitialParseResult(
-                formula=str() as formula,
-                parameters=parameters,
-            ):
-                return FunctionCall(
-                    None,
-                    formula,
-                    tuple(extract_expression(p) for p in parameters or []),
-                )
-            case InitialParseResult():
+            case _:
                 raise InvalidQueryException(
                     "Could not build selected expression for formula"
                 )
-            case _:
-                return Literal(None, param)
-
-    parameters = parsed.parameters or []
-    selected_columns = [
-        SelectedExpression(
-            name=AGGREGATE_ALIAS,
-            expression=FunctionCall(
-                alias=AGGREGATE_ALIAS,
-                function_name=parsed.formula,
-                parameters=tuple(extract_expression(p) for p in parameters),
-            ),
-        )
-    ]
 
-    # The groupbys are pushed down to all the nodes of the query. Add them to the groupby of the query
-    groupby = []
-    for leaf_node in nodes:
-        if leaf_node.groupby:
-            for group_exp in leaf_node.groupby:
-                if isinstance(group_exp.expression, Column):
-                    alias: Optional[str]
-                    if alias_wrap(leaf_node.table_alias):
-                        alias = f"{alias_wrap(leaf_node.table_alias)}.{group_exp.expression.alias}"
-                    else:
-                        alias = group_exp.expression.alias
-                    aliased_groupby = replace(
-                        group_exp,
-                        expression=replace(
-                            group_exp.expression,
-                            alias=alias,
-                            table_name=alias_wrap(leaf_node.table_alias),
-                        ),
-                    )
-                    selected_columns.append(aliased_groupby)
-                    groupby.append(aliased_groupby.expression)
+    # Populate the conditions of a leaf with its table alias. Each leaf also needs
+    # its metric ID condition added.
+    def extract_filters(param: InitialParseResult) -> list[FunctionCall]:
+        table_alias = alias_wrap(param.table_alias)
 
-    if groupby:
-        query.set_ast_groupby(groupby)
-    query.set_ast_selected_columns(selected_columns)
-
-    # Go through all the conditions, populate the conditions with the table alias, add them to the query conditions
-    # also needs the metric ID conditions added
-    def extract_filters(param: InitialParseResult | Any) -> list[FunctionCall]:
         def wrap_condition_columns(fn_call: FunctionCall) -> FunctionCall:
             wrapped_params: list[Expression] = []
             for fn_param in fn_call.parameters:
                 if isinstance(fn_param, Column):
                     wrapped_params.append(
-                        replace(fn_param, table_name=alias_wrap(param.table_alias))
+                        Column(fn_param.alias, table_alias, fn_param.column_name)
                     )
                 elif isinstance(fn_param, FunctionCall):
                     wrapped_params.append(wrap_condition_columns(fn_param))
                 else:
                     wrapped_params.append(fn_param)
-            return replace(fn_call, parameters=tuple(wrapped_params))
+            return FunctionCall(
+                fn_call.alias, fn_call.function_name, tuple(wrapped_params)
+            )
 
+        conditions = []
+        for c in param.conditions or []:
+            assert isinstance(c, FunctionCall)
+            conditions.append(wrap_condition_columns(c))
+        conditions.append(
+            binary_condition(
+                "equals",
+                context_column(table_alias, "metric_id"),
+                Literal(None, param.mri),
+            )
+        )
+        return conditions
+
+    # Walk the formula tree once, building the selected expressions and collecting
+    # the conditions of every leaf at the same time. Formula nodes are visited a
+    # second time, once the expressions of all their parameters have been built.
+    selected_parameters: list[Expression] = []
+    conditions: list[FunctionCall] = []
+    to_visit: list[tuple[FormulaParameter, bool]] = [
+        (p, False) for p in reversed(parsed.parameters)
+    ]
+    while to_visit:
+        param, parameters_built = to_visit.pop()
         if not isinstance(param, InitialParseResult):
-            return []
+            selected_parameters.append(Literal(None, param))
         elif param.expression is not None:
-            conditions = []
-            for c in param.conditions or []:
-                assert isinstance(c, FunctionCall)
-                conditions.append(wrap_condition_columns(c))
-            conditions.append(
-                binary_condition(
-                    "equals",
-                    Column(None, alias_wrap(param.table_alias), "metric_id"),
-                    Literal(None, param.mri),
-                )
+            selected_parameters.append(extract_expression(param))
+            conditions.extend(extract_filters(param))
+        elif param.formula is None:
+            raise InvalidQueryException(
+                "Could not build selected expression for formula"
+            )
+        elif parameters_built:
+            first = len(selected_parameters) - len(param.parameters)
+            formula_parameters = tuple(selected_parameters[first:])
+            del selected_parameters[first:]
+            selected_parameters.append(
+                FunctionCall(None, param.formula, formula_parameters)
             )
-            return conditions
-        elif param.formula:
-            conditions = []
-            for p in param.parameters or []:
-                conditions.extend(extract_filters(p))
-            return conditions
         else:
-            raise InvalidQueryException("Could not extract valid filters for formula")
+            to_visit.append((param, True))
+            to_visit.extend((p, False) for p in reversed(param.parameters))
 
-    conditions = []
-    for p in parsed.parameters or []:
-        conditions.extend(extract_filters(p))
+    selected_columns = [
+        SelectedExpression(
+            name=AGGREGATE_ALIAS,
+            expression=FunctionCall(
+                alias=AGGREGATE_ALIAS,
+                function_name=parsed.formula,
+                parameters=tuple(selected_parameters),
+            ),
+        )
+    ]
+
+    # The groupbys are pushed down to all the nodes of the query. Add them to the groupby of the query
+    groupby: list[Expression] = []
+    for leaf_node in nodes:
+        if not leaf_node.groupby:
+            continue
+        table_alias = alias_wrap(leaf_node.table_alias)
+        for group_exp in leaf_node.groupby:
+            group_col = group_exp.expression
+            if isinstance(group_col, Column):
+                alias = (
+                    f"{table_alias}.{group_col.alias}"
+                    if table_alias
+                    else group_col.alias
+                )
+                aliased_column = Column(alias, table_alias, group_col.column_name)
+                selected_columns.append(
+                    SelectedExpression(group_exp.name, aliased_column)
+                )
+                groupby.append(aliased_column)
+
+    if groupby:
+        query.set_ast_groupby(groupby)
+    query.set_ast_selected_columns(selected_columns)
 
     query.add_condition_to_ast(combine_and_conditions(conditions))
 
@@ -1062,7 +1172,7 @@ def convert_timeseries_to_query(
     conditions: list[Expression] = [
         binary_condition(
             ConditionFunctions.EQ,
-            Column(None, None, "metric_id"),
+            context_column(None, "metric_id"),
             Literal(None, metric_value),
         )
     ]
@@ -1074,9 +1184,7 @@ def convert_timeseries_to_query(
     entity_key = select_entity(metric_value, dataset)
 
     query = LogicalQuery(
-        from_clause=QueryEntity(
-            key=entity_key, schema=get_entity(entity_key).get_data_model()
-        ),
+        from_clause=get_query_entity(entity_key),
         selected_columns=selected_columns,
         condition=final_conditions,
         groupby=groupby,
@@ -1084,14 +1192,24 @@ def convert_timeseries_to_query(
     return query
 
 
+@lru_cache(maxsize=16)
+def get_query_entity(entity_key: EntityKey) -> QueryEntity:
+    """
+    Query entities are immutable and entity schemas do not change for the
+    lifetime of the process, so the same instance is shared by every query.
+    """
+    return QueryEntity(entity_key, get_entity(entity_key).get_data_model())
+
+
 def select_entity(mri: str, dataset: Dataset) -> EntityKey:
     """
     Given an MRI, select the entity that it belongs to.
     """
-    if get_dataset_name(dataset) == "metrics":
+    dataset_name = get_dataset_name(dataset)
+    if dataset_name == "metrics":
         if entity := METRICS_ENTITIES.get(mri[0]):
             return entity
-    elif get_dataset_name(dataset) == "generic_metrics":
+    elif dataset_name == "generic_metrics":
         if entity := GENERIC_ENTITIES.get(mri[0]):
             return entity
 
@@ -1117,6 +1235,10 @@ def populate_query_from_mql_context(
             assert isinstance(data_source, QueryEntity)
             entity_data.append((data_source.key, alias))
 
+    # Time columns are added for every entity, so collect them and write the
+    # selected columns and group by back to the query once.
+    selected_columns = list(query.get_selected_columns())
+    groupby = list(query.get_groupby())
     for entity_key, table_alias in entity_data:
         time_condition = start_end_time_condition(mql_context, entity_key, table_alias)
         scope_condition = scope_conditions(mql_context, table_alias)
@@ -1133,19 +1255,17 @@ def populate_query_from_mql_context(
             query.set_ast_orderby([orderby])
 
         if selected_time:
-            query.set_ast_selected_columns(
-                list(query.get_selected_columns()) + [selected_time]
-            )
-            groupby = query.get_groupby()
-            if groupby:
-                query.set_ast_groupby(list(groupby) + [selected_time.expression])
-            else:
-                query.set_ast_groupby([selected_time.expression])
+            selected_columns.append(selected_time)
+            groupby.append(selected_time.expression)
 
-        if query.get_groupby():
+        if groupby:
             # Only set WITH TOTALS if there is a group by.
             query.set_totals(with_totals)
 
+    if selected_time:
+        query.set_ast_selected_columns(selected_columns)
+        query.set_ast_groupby(groupby)
+
     if isinstance(query, CompositeQuery):
 
         def add_time_join_keys(join_clause: JoinClause[Any]) -> str:
@@ -1249,12 +1369,7 @@ def populate_query_from_mql_context(
                     return FunctionCall(
                         function_name=function_name,
                         alias=alias,
-                        parameters=tuple(
-                            [
-                                convert_cols_to_extrapolated(parameter)
-                                for parameter in parameters
-                            ]
-                        ),
+                        parameters=tuple(map(convert_cols_to_extrapolated, parameters)),
                     )
                 case CurriedFunctionCall(
                     alias=alias,
@@ -1268,21 +1383,16 @@ def populate_query_from_mql_context(
                     return CurriedFunctionCall(
                         alias=alias,
                         internal_function=converted_internal_fn,
-                        parameters=tuple(
-                            [
-                                convert_cols_to_extrapolated(parameter)
-                                for parameter in parameters
-                            ]
-                        ),
+                        parameters=tuple(map(convert_cols_to_extrapolated, parameters)),
                     )
             return expr
 
         query.transform_expressions(convert_cols_to_extrapolated)
 
-    limit = limit_value(mql_context)
-    offset = offset_value(mql_context)
+    limit, offset = limit_offset_values(mql_context)
     query.set_limit(limit)
-    query.set_offset(offset) if offset else None
+    if offset:
+        query.set_offset(offset)
 
     return query, mql_context
 
@@ -1296,17 +1406,23 @@ def quantiles_to_quantile(
     arrays of values to values cause typing errors (e.g. [1] / 1).
     """
 
+    def is_single_quantiles(exp: Expression) -> TypeGuard[CurriedFunctionCall]:
+        return (
+            isinstance(exp, CurriedFunctionCall)
+            and exp.internal_function.function_name in ("quantiles", "quantilesIf")
+            and len(exp.internal_function.parameters) == 1
+        )
+
     def transform(exp: Expression) -> Expression:
-        if isinstance(exp, CurriedFunctionCall):
-            if exp.internal_function.function_name in ("quantiles", "quantilesIf"):
-                if len(exp.internal_function.parameters) == 1:
-                    return arrayElement(
-                        exp.alias, replace(exp, alias=None), Literal(None, 1)
-                    )
+        if is_single_quantiles(exp):
+            return arrayElement(exp.alias, replace(exp, alias=None), Literal(None, 1))
 
         return exp
 
-    query.transform_expressions(transform)
+    # Most MQL queries don't use quantiles, so avoid rebuilding the whole AST
+    # when there is nothing to rewrite.
+    if any(map(is_single_quantiles, query.get_all_expressions())):
+        query.transform_expressions(transform)
 
 
 CustomProcessors = Sequence[
@@ -1318,6 +1434,14 @@ MQL_POST_PROCESSORS: CustomProcessors = POST_PROCESSORS + [
 ]
 
 
+def _start_span(op: str, description: str) -> ContextManager[Any]:
+    # Sentry allocates a span even when no transaction will ever send it, so
+    # don't start one at all when tracing is disabled.
+    if has_tracing_enabled(sentry_sdk.get_client().options):
+        return sentry_sdk.start_span(op=op, description=description)
+    return nullcontext()
+
+
 def parse_mql_query(
     body: str,
     mql_context_dict: dict[str, Any],
@@ -1344,7 +1468,7 @@ def parse_mql_query(
     # NOTE (volo): The anonymizer that runs after this function call chokes on
     # OR and AND clauses with multiple parameters so we have to treeify them
     # before we run the anonymizer and the rest of the post processors
-    with sentry_sdk.start_span(op="processor", description="treeify_conditions"):
+    with _start_span(op="processor", description="treeify_conditions"):
         _post_process(query, [_treeify_or_and_conditions], settings)
 
     res = PostProcessAndValidateMQLQuery().execute(
@@ -1378,19 +1502,15 @@ class ParsePopulateResolveMQL(
     ) -> LogicalQuery:
         mql_str, dataset, mql_context_dict, settings = pipe_input.data
 
-        with sentry_sdk.start_span(op="parser", description="parse_mql_query_initial"):
+        with _start_span(op="parser", description="parse_mql_query_initial"):
             query = parse_mql_query_body(mql_str, dataset)
 
-        with sentry_sdk.start_span(
-            op="parser", description="populate_query_from_mql_context"
-        ):
+        with _start_span(op="parser", description="populate_query_from_mql_context"):
             query, mql_context = populate_query_from_mql_context(
                 query, mql_context_dict
             )
 
-        with sentry_sdk.start_span(
-            op="processor", description="resolve_indexer_mappings"
-        ):
+        with _start_span(op="processor", description="resolve_indexer_mappings"):
             resolve_mappings(query, mql_context.indexer_mappings, dataset)
 
         if settings and settings.get_dry_run():
@@ -1420,7 +1540,7 @@ class PostProcessAndValidateMQLQuery(
         ],
     ) -> LogicalQuery:
         query, settings, custom_processing = pipe_input.data
-        with sentry_sdk.start_span(op="processor", description="post_processors"):
+        with _start_span(op="processor", description="post_processors"):
             _post_process(
                 query,
                 MQL_POST_PROCESSORS,
@@ -1428,25 +1548,23 @@ class PostProcessAndValidateMQLQuery(
             )
 
         # Filter in select optimizer
-        with sentry_sdk.start_span(
-            op="processor", description="filter_in_select_optimize"
-        ):
+        with _start_span(op="processor", description="filter_in_select_optimize"):
             if settings is None:
                 FilterInSelectOptimizer().process_query(query, HTTPQuerySettings())
             else:
                 FilterInSelectOptimizer().process_query(query, settings)
 
         # Custom processing to tweak the AST before validation
-        with sentry_sdk.start_span(op="processor", description="custom_processing"):
+        with _start_span(op="processor", description="custom_processing"):
             if custom_processing is not None:
                 _post_process(query, custom_processing, settings)
 
         # Time based processing
-        with sentry_sdk.start_span(op="processor", description="time_based_processing"):
+        with _start_span(op="processor", description="time_based_processing"):
             _post_process(query, [_replace_time_condition], settings)
 
         # Validating
-        with sentry_sdk.start_span(op="validate", description="expression_validators"):
+        with _start_span(op="validate", description="expression_validators"):
             _post_process(query, VALIDATORS)
 
         return query
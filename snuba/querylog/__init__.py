@@ -1,8 +1,9 @@
 from __future__ import annotations
 
 import time
+from functools import lru_cache, partial
 from random import random
-from typing import Any, Mapping, Optional, Union
+from typing import Any, Mapping, Optional, Sequence, Union
 from uuid import UUID
 
 import sentry_sdk
@@ -14,8 +15,10 @@ from snuba.cogs.accountant import record_cogs
 from snuba.datasets.storage import StorageNotAvailable
 from snuba.query.exceptions import QueryPlanException
 from snuba.querylog.query_metadata import QueryStatus, SnubaQueryMetadata, Status
+from snuba.querylog.worker import record_query_worker
 from snuba.request import Request
 from snuba.utils.metrics.timer import Timer
+from snuba.utils.metrics.types import Tags
 from snuba.utils.metrics.wrapper import MetricsWrapper
 from snuba.web import QueryException, QueryResult
 
@@ -23,16 +26,19 @@ metrics = MetricsWrapper(environment.metrics, "api")
 from snuba.querylog.query_metadata import get_request_status
 
 
-def _record_timer_metrics(
+def _timer_metric_tags(
     request: Request,
-    timer: Timer,
     query_metadata: SnubaQueryMetadata,
     result: Union[QueryResult, QueryException, QueryPlanException],
-) -> None:
+) -> tuple[dict[str, str], dict[str, str]]:
+    """
+    Returns the tags of the timer metric and of its marks.
+    """
     final = str(request.query.get_final())
     referrer = request.referrer or "none"
     app_id = request.attribution_info.app_id.key or "none"
     parent_api = request.attribution_info.parent_api or "none"
+    dataset = query_metadata.dataset
     tags = {
         "status": query_metadata.status.value,
         "request_status": query_metadata.request_status.value,
@@ -40,41 +46,29 @@ def _record_timer_metrics(
         "referrer": referrer,
         "parent_api": parent_api,
         "final": final,
-        "dataset": query_metadata.dataset,
+        "dataset": dataset,
         "app_id": app_id,
     }
     mark_tags = {
         "final": final,
         "referrer": referrer,
         "parent_api": parent_api,
-        "dataset": query_metadata.dataset,
+        "dataset": dataset,
     }
     if isinstance(result, StorageNotAvailable):
         # The QueryPlanException is raised outside the query execution flow.
         # As a result, its status and SLO values are not based on its query_list
         status = get_request_status(result)
-        tags = {
-            "status": QueryStatus.ERROR.value,
-            "request_status": status.status.value,
-            "slo": status.slo.value,
-            "referrer": referrer,
-            "parent_api": parent_api,
-            "final": final,
-            "dataset": query_metadata.dataset,
-            "app_id": app_id,
-        }
-
-    timer.send_metrics_to(
-        metrics,
-        tags=tags,
-        mark_tags=mark_tags,
-    )
+        tags["status"] = QueryStatus.ERROR.value
+        tags["request_status"] = status.status.value
+        tags["slo"] = status.slo.value
 
+    return tags, mark_tags
 
-def _record_bytes_scanned_metrics(
-    query_metadata: SnubaQueryMetadata,
+
+def _bytes_scanned(
     result: Union[QueryResult, QueryException, QueryPlanException],
-) -> None:
+) -> Optional[tuple[int, int]]:
     """
     Experimental metrics - trying to understand whether or not
     profile.bytes is correct or we should be using progress.bytes
@@ -82,19 +76,35 @@ def _record_bytes_scanned_metrics(
 
     Should be removed once we have gathered data and made a decision.
     """
-    if not isinstance(result, QueryResult):
-        return
+    if type(result) is not QueryResult:
+        return None
     profile = result.result["profile"]
-    if not profile or "progress_bytes" not in profile or "bytes" not in profile:
-        return
-
-    tags = {"dataset": query_metadata.dataset}
-
-    profile_bytes = profile["bytes"]
-    metrics.increment("profile_bytes", profile_bytes, tags)
-
-    progress_bytes = profile["progress_bytes"]
-    metrics.increment("progress_bytes", progress_bytes, tags)
+    if not profile:
+        return None
+    profile_bytes = profile.get("bytes")
+    progress_bytes = profile.get("progress_bytes")
+    if profile_bytes is None or progress_bytes is None:
+        return None
+    return profile_bytes, progress_bytes
+
+
+def _send_query_record(
+    querylog_payload: snuba_queries_v1.Querylog,
+    timings: Sequence[tuple[str, int, Tags]],
+    dataset: str,
+    bytes_scanned: Optional[tuple[int, int]],
+) -> None:
+    # Send to redis
+    state.record_query(querylog_payload)
+    # All the metrics of a query are sent together
+    with metrics.batch():
+        for name, duration, tags in timings:
+            metrics.timing(name, duration, tags=tags)
+        if bytes_scanned is not None:
+            profile_bytes, progress_bytes = bytes_scanned
+            bytes_tags = {"dataset": dataset}
+            metrics.increment("profile_bytes", profile_bytes, bytes_tags)
+            metrics.increment("progress_bytes", progress_bytes, bytes_tags)
 
 
 def _record_cogs(
@@ -106,22 +116,35 @@ def _record_cogs(
     Record bytes scanned for the clickhouse compute of resource of a query.
     """
 
-    if not isinstance(result, QueryResult):
+    if type(result) is not QueryResult:
         return
 
     profile = result.result.get("profile")
     if not profile or (bytes_scanned := profile.get("progress_bytes")) is None:
         return
 
+    # Sample before any other work, most queries are not recorded.
+    probability = state.get_config("snuba_api_cogs_probability")
+    if not probability or random() >= probability:
+        return
+
+    # Only track shared clusters
+    cluster_name = _cogs_resource_id(
+        query_metadata.query_list[0].stats.get("cluster_name", "")
+    )
+    if cluster_name is None:
+        return
+
     # The dataset is usually a good proxy for app_feature
     # However, this is not always the case. We can
     # check the entity as well as a fallback option
     # if the dataset is incorrect in the querylog.
 
-    app_feature = query_metadata.dataset.replace("_", "")
+    dataset = query_metadata.dataset
+    app_feature = dataset.replace("_", "")
 
     if (
-        query_metadata.dataset == "generic_metrics"
+        dataset == "generic_metrics"
         or query_metadata.entity.startswith("generic_metrics")
     ) and (
         (use_case_id := request.attribution_info.tenant_ids.get("use_case_id"))
@@ -129,32 +152,37 @@ def _record_cogs(
     ):
         app_feature = f"genericmetrics_{use_case_id}"
 
-    elif query_metadata.dataset == "events":
+    elif dataset == "events":
         app_feature = "errors"
 
-    cluster_name = query_metadata.query_list[0].stats.get("cluster_name", "")
+    record_query_worker.submit(
+        partial(
+            record_cogs,
+            resource_id=cluster_name,
+            app_feature=app_feature,
+            amount=bytes_scanned,
+            usage_type=UsageUnit.BYTES,
+        )
+    )
+
+    # TODO: Record the time spent in the API compared to time spent running the
+    # Clickhouse query, so we can track usage of the API pods themselves.
 
-    if not cluster_name.startswith("snuba-gen-metrics"):
-        return  # Only track shared clusters
 
-    # Sanitize the cluster name to line up with the resource_id naming convention
-    cluster_name = (
+@lru_cache(maxsize=32)
+def _cogs_resource_id(cluster_name: str) -> Optional[str]:
+    """
+    Sanitizes the name of a shared cluster to line up with the resource_id
+    naming convention. Returns None for clusters that are not shared.
+    """
+    if not cluster_name.startswith("snuba-gen-metrics"):
+        return None
+    return (
         cluster_name.replace("-", "_")
         .replace("snuba_gen_metrics", "generic_metrics_clickhouse")
         .replace("_0", "")
     )
 
-    if random() < (state.get_config("snuba_api_cogs_probability") or 0):
-        record_cogs(
-            resource_id=f"{cluster_name}",
-            app_feature=app_feature,
-            amount=bytes_scanned,
-            usage_type=UsageUnit.BYTES,
-        )
-
-        # TODO: Record the time spent in the API compared to time spent running the
-        # Clickhouse query, so we can track usage of the API pods themselves.
-
 
 def record_query(
     request: Request,
@@ -167,19 +195,32 @@ def record_query(
     we actually ran a query or not.
     """
 
-    extra_data: Mapping[str, Any] = {}
-    if not isinstance(result, QueryPlanException):
-        extra_data = result.extra
     if settings.RECORD_QUERIES:
-        # Send to redis
+        # Everything is read from the request, timer and result here, while
+        # they still describe the query as it ran, and only the resulting
+        # values are handed to the background worker.
         # We convert this to a dict before passing it to state in order to avoid a
         # circular dependency, where state would depend on the higher level
         # QueryMetadata class
-        state.record_query(query_metadata.to_dict())
-        _record_timer_metrics(request, timer, query_metadata, result)
-        _record_bytes_scanned_metrics(query_metadata, result)
+        querylog_payload = query_metadata.to_dict()
+        tags, mark_tags = _timer_metric_tags(request, query_metadata, result)
+        record_query_worker.submit(
+            partial(
+                _send_query_record,
+                querylog_payload,
+                timer.get_timings(tags, mark_tags),
+                query_metadata.dataset,
+                _bytes_scanned(result),
+            )
+        )
         _record_cogs(request, query_metadata, result)
-        _add_tags(timer, extra_data.get("experiments"), query_metadata)
+        # Sentry tags belong to the scope of the request thread
+        experiments = (
+            None
+            if isinstance(result, QueryPlanException)
+            else result.extra.get("experiments")
+        )
+        _add_tags(timer, experiments, query_metadata)
 
 
 def _add_tags(
@@ -189,18 +230,19 @@ def _add_tags(
 ) -> None:
     if sentry_sdk.get_current_span():
         duration_group = timer.get_duration_group()
-        sentry_sdk.set_tag("duration_group", duration_group)
+        tags: dict[str, Any] = {"duration_group": duration_group}
         if duration_group == ">30s":
-            sentry_sdk.set_tag("timeout", "too_long")
+            tags["timeout"] = "too_long"
         if experiments is not None:
             for name, value in experiments.items():
-                sentry_sdk.set_tag(name, str(value))
+                tags[name] = str(value)
         if metadata is not None:
             for query_data in metadata.query_list:
                 max_threads = query_data.stats.get("max_threads")
                 if max_threads is not None:
-                    sentry_sdk.set_tag("max_threads", max_threads)
+                    tags["max_threads"] = max_threads
                     break
+        sentry_sdk.set_tags(tags)
 
 
 def _build_failed_request_dict(
@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime
 from enum import Enum
 from typing import Any, Dict, MutableSequence, Optional, Set, cast
@@ -89,10 +89,13 @@ class SLO(Enum):
 @dataclass(frozen=True)
 class Status:
     status: RequestStatus
+    # Derived from the status once, it is read for every recorded query.
+    slo: SLO = field(init=False, repr=False, compare=False)
 
-    @property
-    def slo(self) -> SLO:
-        return SLO.FOR if self.status in SLO_FOR else SLO.AGAINST
+    def __post_init__(self) -> None:
+        object.__setattr__(
+            self, "slo", SLO.FOR if self.status in SLO_FOR else SLO.AGAINST
+        )
 
 
 # Statuses that don't impact the SLO
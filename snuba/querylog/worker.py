@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import atexit
+import logging
+import threading
+from queue import Full, Queue
+from typing import Callable
+
+from snuba import environment, settings
+from snuba.utils.metrics.wrapper import MetricsWrapper
+
+logger = logging.getLogger(__name__)
+metrics = MetricsWrapper(environment.metrics, "api")
+
+
+class RecordQueryWorker:
+    """
+    Runs the recording of served queries (querylog, metrics, COGS) on a
+    small pool of background threads so it is not part of the request
+    latency. Recordings are dropped when the queue is full rather than
+    blocking the request.
+    """
+
+    def __init__(self, workers: int, max_pending: int) -> None:
+        self.__workers = workers
+        self.__queue: Queue[Callable[[], None]] = Queue(maxsize=max_pending)
+        self.__lock = threading.Lock()
+        self.__threads: list[threading.Thread] = []
+
+    def submit(self, task: Callable[[], None]) -> None:
+        if self.__workers <= 0:
+            task()
+            return
+        self.__ensure_running()
+        try:
+            self.__queue.put_nowait(task)
+        except Full:
+            metrics.increment("record_query.dropped")
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """
+        Waits until every submitted recording has run, or until the timeout
+        expires. Returns whether everything was recorded.
+        """
+        with self.__queue.all_tasks_done:
+            return self.__queue.all_tasks_done.wait_for(
+                lambda: not self.__queue.unfinished_tasks, timeout
+            )
+
+    def __ensure_running(self) -> None:
+        # Threads are started lazily, and restarted if the process forked
+        # after they were started.
+        if self.__threads and all(t.is_alive() for t in self.__threads):
+            return
+        with self.__lock:
+            self.__threads = [t for t in self.__threads if t.is_alive()]
+            while len(self.__threads) < self.__workers:
+                thread = threading.Thread(
+                    target=self.__run,
+                    name=f"record_query_{len(self.__threads)}",
+                    daemon=True,
+                )
+                thread.start()
+                self.__threads.append(thread)
+
+    def __run(self) -> None:
+        while True:
+            task = self.__queue.get()
+            try:
+                task()
+            except Exception as ex:
+                logger.exception("Could not record query due to error: %r", ex)
+            finally:
+                self.__queue.task_done()
+
+
+record_query_worker = RecordQueryWorker(
+    workers=settings.RECORD_QUERIES_WORKERS,
+    max_pending=settings.RECORD_QUERIES_QUEUE_SIZE,
+)
+# Recordings submitted before a fork are never run by the child, so don't
+# wait for them forever at exit.
+atexit.register(record_query_worker.flush, timeout=5.0)
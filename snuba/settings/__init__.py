@@ -195,6 +195,11 @@ REDIS_CLUSTERS: RedisClusters = {
 
 # Query Recording Options
 RECORD_QUERIES = False
+# Number of background threads recording queries after they are served, and
+# how many queries may wait for them before new ones are dropped. With no
+# workers queries are recorded on the request thread.
+RECORD_QUERIES_WORKERS = 1
+RECORD_QUERIES_QUEUE_SIZE = 1000
 
 # Record COGS
 RECORD_COGS = False
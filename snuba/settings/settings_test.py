@@ -8,6 +8,7 @@ STATS_IN_RESPONSE = True
 CONFIG_MEMOIZE_TIMEOUT = 0
 
 RECORD_QUERIES = True
+RECORD_QUERIES_WORKERS = 0
 
 SENTRY_DSN = os.getenv("SENTRY_DSN")
 
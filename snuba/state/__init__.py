@@ -122,30 +122,55 @@ def set_config(
     force: bool = False,
     config_key: str = config_hash,
 ) -> None:
-    value = get_typed_value(value)
-    enc_value = "{}".format(value).encode("utf-8") if value is not None else None
-    try:
-        enc_original_value = rds.hget(config_key, key)
-        if enc_original_value is not None and value is not None:
-            original_value = get_typed_value(enc_original_value.decode("utf-8"))
-            if value == original_value and type(value) == type(original_value):
-                return
+    set_configs({key: value}, user=user, force=force, config_key=config_key)
 
-            if not force and type(value) != type(original_value):
-                raise MismatchedTypeException(key, type(original_value), type(value))
 
-        change_record = (time.time(), user, enc_original_value, enc_value)
+def set_configs(
+    values: Mapping[str, Optional[Any]],
+    user: Optional[str] = None,
+    force: bool = False,
+    config_key: str = config_hash,
+) -> None:
+    """
+    Sets several configs with one read and one pipelined write. The values
+    are all type checked before any of them is written.
+    """
+    if not values:
+        return
+    keys = list(values)
+    try:
         p = rds.pipeline()
-        if value is None:
-            p.hdel(config_key, key)
-            p.hdel(config_history_hash, key)
-        else:
-            p.hset(config_key, key, enc_value)
-            p.hset(config_history_hash, key, json.dumps(change_record))
-        p.lpush(config_changes_list, json.dumps((key, change_record)))
+        changed = []
+        for key, enc_original_value in zip(keys, rds.hmget(config_key, keys)):
+            value = get_typed_value(values[key])
+            enc_value = (
+                "{}".format(value).encode("utf-8") if value is not None else None
+            )
+            if enc_original_value is not None and value is not None:
+                original_value = get_typed_value(enc_original_value.decode("utf-8"))
+                if value == original_value and type(value) == type(original_value):
+                    continue
+
+                if not force and type(value) != type(original_value):
+                    raise MismatchedTypeException(
+                        key, type(original_value), type(value)
+                    )
+
+            change_record = (time.time(), user, enc_original_value, enc_value)
+            if value is None:
+                p.hdel(config_key, key)
+                p.hdel(config_history_hash, key)
+            else:
+                p.hset(config_key, key, enc_value)
+                p.hset(config_history_hash, key, json.dumps(change_record))
+            p.lpush(config_changes_list, json.dumps((key, change_record)))
+            changed.append((key, value))
+        if not changed:
+            return
         p.ltrim(config_changes_list, 0, config_changes_list_limit)
         p.execute()
-        logger.info(f"Successfully changed option {key} to {value}")
+        for key, value in changed:
+            logger.info(f"Successfully changed option {key} to {value}")
     except MismatchedTypeException as exc:
         logger.exception(
             f"Mismatched types for {exc.key}: Original type: {exc.original_type}, New type: {exc.new_type}"
@@ -155,16 +180,6 @@ def set_config(
         logger.exception(ex)
 
 
-def set_configs(
-    values: Mapping[str, Optional[Any]],
-    user: Optional[str] = None,
-    force: bool = False,
-    config_key: str = config_hash,
-) -> None:
-    for k, v in values.items():
-        set_config(k, v, user=user, force=force, config_key=config_key)
-
-
 def get_int_config(
     key: str, default: Optional[int] = None, config_key: str = config_hash
 ) -> Optional[int]:
@@ -196,13 +211,13 @@ def get_config(
 def _get_config(
     key: str, default: Optional[Any] = None, config_key: str = config_hash
 ) -> Optional[Any]:
-    return get_all_configs(config_key=config_key).get(key, default)
+    return get_raw_configs(config_key=config_key).get(key, default)
 
 
 def get_configs(
     key_defaults: Iterable[Tuple[str, Optional[Any]]], config_key: str = config_hash
 ) -> Sequence[Optional[Any]]:
-    all_confs = get_all_configs(config_key=config_key)
+    all_confs = get_raw_configs(config_key=config_key)
     return [all_confs.get(k, d) for k, d in key_defaults]
 
 
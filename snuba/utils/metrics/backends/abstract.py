@@ -1,5 +1,6 @@
 from abc import ABC, abstractmethod
-from typing import Optional, Union
+from contextlib import contextmanager
+from typing import Iterator, Optional, Union
 
 from snuba.utils.metrics.types import Tags
 
@@ -90,3 +91,18 @@ class MetricsBackend(ABC):
         tags: Optional[Tags] = None,
     ) -> None:
         raise NotImplementedError
+
+    @contextmanager
+    def batch(self) -> Iterator[None]:
+        """
+        Group the metrics recorded inside this block so backends that
+        support it can send them together, e.g. in a single packet.
+        Backends that don't support batching send them as usual.
+
+        Example:
+
+        with metrics.batch():
+            metrics.increment("requests")
+            metrics.timing("request.latency", request_latency_in_ms)
+        """
+        yield
@@ -1,7 +1,8 @@
 from __future__ import annotations
 
 import threading
-from typing import Callable, Mapping, Optional, Sequence, Union
+from contextlib import contextmanager
+from typing import Callable, Iterator, Mapping, Optional, Sequence, Union
 
 from datadog import DogStatsd
 
@@ -40,6 +41,21 @@ class DatadogMetricsBackend(MetricsBackend):
             client = self.__thread_state.client = self.__client_factory()
         return client
 
+    @contextmanager
+    def batch(self) -> Iterator[None]:
+        # Clients are per thread, so each thread buffers its own metrics. Only
+        # the outermost batch opens and flushes the buffer.
+        depth = getattr(self.__thread_state, "batch_depth", 0)
+        if depth == 0:
+            self.__client.open_buffer()
+        self.__thread_state.batch_depth = depth + 1
+        try:
+            yield
+        finally:
+            self.__thread_state.batch_depth = depth
+            if depth == 0:
+                self.__client.close_buffer()
+
     def __normalize_tags(self, tags: Optional[Tags]) -> Optional[Sequence[str]]:
         if tags is None:
             return None
@@ -1,6 +1,8 @@
 from __future__ import annotations
 
 import random
+from contextlib import contextmanager
+from typing import Iterator
 
 from snuba import settings
 from snuba.utils.metrics.backends.abstract import MetricsBackend
@@ -27,6 +29,11 @@ class SentryDatadogMetricsBackend(MetricsBackend):
             return bool(random.random() < settings.DDM_METRICS_SAMPLE_RATE)
         return False
 
+    @contextmanager
+    def batch(self) -> Iterator[None]:
+        with self.datadog.batch():
+            yield
+
     def increment(
         self,
         name: str,
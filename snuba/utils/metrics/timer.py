@@ -1,5 +1,5 @@
 from itertools import groupby
-from typing import Dict, Mapping, MutableSequence, Optional, Tuple
+from typing import Dict, Mapping, MutableSequence, Optional, Sequence, Tuple
 
 from sentry_kafka_schemas.schema_types.snuba_queries_v1 import TimerData
 
@@ -74,17 +74,33 @@ class Timer:
     def for_json(self) -> TimerData:
         return self.finish()
 
+    def get_timings(
+        self,
+        tags: Optional[Tags] = None,
+        mark_tags: Optional[Tags] = None,
+    ) -> Sequence[Tuple[str, int, Tags]]:
+        """
+        Returns the name, duration and tags of every timing metric of this
+        timer, as send_metrics_to would send them.
+        """
+        data = self.finish()
+        merged_tags = {**data["tags"], **tags} if tags else dict(data["tags"])
+        merged_mark_tags = (
+            {**data["tags"], **mark_tags} if mark_tags else dict(data["tags"])
+        )
+        return [
+            (self.__name, data["duration_ms"], merged_tags),
+            *(
+                (f"{self.__name}.{mark}", duration, merged_mark_tags)
+                for mark, duration in data["marks_ms"].items()
+            ),
+        ]
+
     def send_metrics_to(
         self,
         backend: MetricsBackend,
         tags: Optional[Tags] = None,
         mark_tags: Optional[Tags] = None,
     ) -> None:
-        data = self.finish()
-        merged_tags = {**data["tags"], **tags} if tags else self.__tags
-        backend.timing(self.__name, data["duration_ms"], tags=merged_tags)
-        for mark, duration in data["marks_ms"].items():
-            merged_mark_tags = (
-                {**data["tags"], **mark_tags} if mark_tags else data["tags"]
-            )
-            backend.timing(f"{self.__name}.{mark}", duration, tags=merged_mark_tags)
+        for name, duration, metric_tags in self.get_timings(tags, mark_tags):
+            backend.timing(name, duration, tags=metric_tags)
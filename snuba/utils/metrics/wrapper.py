@@ -1,4 +1,5 @@
-from typing import Optional, Union
+from contextlib import contextmanager
+from typing import Iterator, Optional, Union
 
 from snuba.utils.metrics.backends.abstract import MetricsBackend
 from snuba.utils.metrics.types import Tags
@@ -29,6 +30,11 @@ class MetricsWrapper(MetricsBackend):
         else:
             return {**tags, **self.__tags}
 
+    @contextmanager
+    def batch(self) -> Iterator[None]:
+        with self.__backend.batch():
+            yield
+
     def increment(
         self,
         name: str,
@@ -14,6 +14,30 @@ def test_multiple_queries() -> None:
         validate_ro_query("SELECT * FROM my_table; SELECT * FROM other_table")
 
 
+def test_keywords_in_identifiers_literals_and_comments() -> None:
+    validate_ro_query("SELECT insertion_time FROM my_table")
+    validate_ro_query("SELECT * FROM my_table WHERE name = 'insert; drop'")
+    validate_ro_query("SELECT * FROM my_table -- drop this later")
+    validate_ro_query("SELECT * FROM my_table /* ; */")
+    with pytest.raises(InvalidCustomQuery):
+        validate_ro_query("SELECT * FROM my_table; DROP TABLE my_table")
+    with pytest.raises(InvalidCustomQuery):
+        validate_ro_query("ALTER TABLE my_table DELETE WHERE 1")
+
+
+def test_oversized_query() -> None:
+    with pytest.raises(InvalidCustomQuery):
+        validate_ro_query("SELECT * FROM my_table WHERE x = '" + "a" * 65536 + "'")
+
+
+def test_non_ascii_literals() -> None:
+    validate_ro_query("SELECT * FROM my_table WHERE name = 'caf\u00e9'")
+    with pytest.raises(InvalidCustomQuery):
+        validate_ro_query(
+            "SELECT * FROM my_table WHERE name = 'caf\u00e9'; DROP TABLE x"
+        )
+
+
 def test_allowed_tables() -> None:
     validate_ro_query(
         "SELECT * FROM my_table, other_table",
@@ -34,7 +34,7 @@ class FakeClickhouseResult:
     results: Sequence[Any]
 
 
-@pytest.fixture
+@pytest.fixture(scope="module")
 def admin_api() -> FlaskClient:
     from snuba.admin.views import application
 
@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+import math
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal
+
+from flask import Flask
+
+from snuba.admin.json_provider import RapidJSONProvider
+
+
+@dataclass
+class Row:
+    name: str
+    count: int
+
+
+def test_matches_default_provider() -> None:
+    app = Flask(__name__)
+    default = app.json
+    provider = RapidJSONProvider(app)
+    value = {
+        "rows": [Row("a", 1), Row("é", 2**70)],
+        "timestamp": datetime(2024, 1, 2, 3, 4, 5),
+        "id": uuid.UUID(int=1),
+        "amount": Decimal("1.5"),
+        "tuple": (1, 2.5, None, True),
+    }
+
+    assert provider.loads(provider.dumps(value)) == default.loads(default.dumps(value))
+
+
+def test_response() -> None:
+    app = Flask(__name__)
+    app.json = RapidJSONProvider(app)
+    with app.app_context():
+        response = app.json.response({"b": 1, "a": [float("nan")]})
+
+    assert response.mimetype == "application/json"
+    assert response.get_data(as_text=True).startswith('{"a":[NaN],"b":1}')
+    assert math.isnan(app.json.loads(response.data)["a"][0])
@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+from typing import Callable
+from unittest import mock
+
+import pytest
+from usageaccountant import UsageUnit
+
+from snuba.querylog import _record_cogs, record_query
+from snuba.querylog.query_metadata import QueryStatus, RequestStatus, SLO
+from snuba.utils.metrics.timer import Timer
+from snuba.utils.metrics.wrapper import MetricsWrapper
+from snuba.web import QueryException, QueryResult
+
+
+def test_record_query_reads_request_before_submitting() -> None:
+    request = mock.Mock()
+    request.query.get_final.return_value = False
+    request.referrer = "some_referrer"
+    request.attribution_info.app_id.key = "some_app"
+    request.attribution_info.parent_api = None
+
+    query_metadata = mock.Mock(dataset="events", query_list=[])
+    query_metadata.status = QueryStatus.ERROR
+    query_metadata.request_status = RequestStatus.INVALID_REQUEST
+    query_metadata.slo = SLO.FOR
+    query_metadata.to_dict.return_value = {"request": {"id": "a"}}
+
+    error = QueryException.from_args(
+        "SomeError", "message", extra={"stats": {}, "sql": "", "experiments": {}}
+    )
+    submitted: list[Callable[[], None]] = []
+
+    with mock.patch("snuba.settings.RECORD_QUERIES", True), mock.patch(
+        "snuba.querylog.record_query_worker.submit", new=submitted.append
+    ), mock.patch("snuba.querylog.state.record_query") as state_record_query:
+        record_query(request, Timer("query"), query_metadata, error)
+        # The request is updated once the query has been recorded, before the
+        # worker got to it.
+        request.query.get_final.return_value = True
+        query_metadata.to_dict.return_value = {"request": {"id": "b"}}
+
+        with mock.patch(
+            "snuba.querylog.metrics", new=mock.MagicMock(spec=MetricsWrapper)
+        ) as metrics_mock:
+            for task in submitted:
+                task()
+
+    state_record_query.assert_called_once_with({"request": {"id": "a"}})
+    timing = metrics_mock.timing.call_args_list[0]
+    assert timing.args[0] == "query"
+    assert timing.kwargs["tags"]["final"] == "False"
+    assert timing.kwargs["tags"]["referrer"] == "some_referrer"
+
+
+def _cogs_query_result() -> QueryResult:
+    return QueryResult(
+        result={"meta": [], "data": [], "profile": {"progress_bytes": 1000}},
+        extra={"stats": {}, "sql": "", "experiments": {}},
+    )
+
+
+def _cogs_query_metadata() -> mock.Mock:
+    query_metadata = mock.Mock(dataset="generic_metrics", entity="generic_metrics")
+    query_metadata.query_list = [mock.Mock(stats={"cluster_name": "snuba-gen-metrics"})]
+    return query_metadata
+
+
+def test_record_cogs_is_sampled_before_submitting() -> None:
+    request = mock.Mock()
+    request.attribution_info.tenant_ids = {"use_case_id": "spans"}
+
+    with mock.patch("snuba.querylog.record_query_worker") as worker, mock.patch(
+        "snuba.querylog.state.get_config", return_value=0
+    ):
+        _record_cogs(request, _cogs_query_metadata(), _cogs_query_result())
+    worker.submit.assert_not_called()
+
+    with mock.patch("snuba.querylog.record_query_worker") as worker, mock.patch(
+        "snuba.querylog.state.get_config", return_value=1.0
+    ), mock.patch("snuba.querylog.record_cogs") as record_cogs:
+        _record_cogs(request, _cogs_query_metadata(), _cogs_query_result())
+        worker.submit.assert_called_once()
+        worker.submit.call_args.args[0]()
+    record_cogs.assert_called_once_with(
+        resource_id="generic_metrics_clickhouse",
+        app_feature="genericmetrics_spans",
+        amount=1000,
+        usage_type=UsageUnit.BYTES,
+    )
+
+
+@pytest.mark.parametrize("probability", [None, 0, 0.0])
+def test_record_cogs_returns_early_when_not_sampled(
+    probability: float | None,
+) -> None:
+    with mock.patch(
+        "snuba.querylog.state.get_config", return_value=probability
+    ), mock.patch("snuba.querylog._cogs_resource_id") as cogs_resource_id:
+        _record_cogs(mock.Mock(), _cogs_query_metadata(), _cogs_query_result())
+    cogs_resource_id.assert_not_called()
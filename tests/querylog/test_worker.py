@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import threading
+from functools import partial
+
+from snuba.querylog.worker import RecordQueryWorker
+
+
+def test_records_on_background_thread() -> None:
+    worker = RecordQueryWorker(workers=2, max_pending=10)
+    recorded: list[tuple[int, threading.Thread]] = []
+
+    def record(i: int) -> None:
+        recorded.append((i, threading.current_thread()))
+
+    for i in range(5):
+        worker.submit(partial(record, i))
+    worker.flush()
+
+    assert sorted(i for i, _ in recorded) == [0, 1, 2, 3, 4]
+    assert all(thread is not threading.main_thread() for _, thread in recorded)
+
+
+def test_drops_when_full() -> None:
+    worker = RecordQueryWorker(workers=1, max_pending=1)
+    release = threading.Event()
+    started = threading.Event()
+    recorded: list[int] = []
+
+    def block() -> None:
+        started.set()
+        release.wait()
+
+    worker.submit(block)
+    started.wait()
+    worker.submit(lambda: recorded.append(1))
+    worker.submit(lambda: recorded.append(2))
+    release.set()
+    worker.flush()
+
+    assert recorded == [1]
+
+
+def test_failed_recording_does_not_stop_worker() -> None:
+    worker = RecordQueryWorker(workers=1, max_pending=10)
+    recorded: list[int] = []
+
+    def fail() -> None:
+        raise ValueError("boom")
+
+    worker.submit(fail)
+    worker.submit(lambda: recorded.append(1))
+    worker.flush()
+
+    assert recorded == [1]
+
+
+def test_records_synchronously_without_workers() -> None:
+    worker = RecordQueryWorker(workers=0, max_pending=10)
+    recorded: list[threading.Thread] = []
+    worker.submit(lambda: recorded.append(threading.current_thread()))
+
+    assert recorded == [threading.current_thread()]
+
+
+def test_flush_timeout() -> None:
+    worker = RecordQueryWorker(workers=1, max_pending=10)
+    release = threading.Event()
+
+    def block() -> None:
+        release.wait()
+
+    worker.submit(block)
+    assert not worker.flush(timeout=0.01)
+    release.set()
+    assert worker.flush(timeout=5.0)
@@ -1,5 +1,23 @@
+from typing import cast
+
+import pytest
+import simplejson as json
+from sentry_kafka_schemas.schema_types import snuba_queries_v1
+
+from snuba import state
 from snuba.state import _kafka_producer
 
 
 def test_get_producer() -> None:
     assert _kafka_producer() is not None
+
+
+@pytest.mark.redis_db
+def test_record_query_writes_queries_list() -> None:
+    for request_id in ("a", "b", "c"):
+        state.record_query(
+            cast(snuba_queries_v1.Querylog, {"request": {"id": request_id}})
+        )
+
+    recorded = state.rds.lrange(state.queries_list, 0, -1)
+    assert [json.loads(q)["request"]["id"] for q in recorded] == ["c", "b", "a"]
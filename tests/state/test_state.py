@@ -1,6 +1,7 @@
 import random
 import time
-from collections import ChainMap
+from collections import ChainMap, namedtuple
+from decimal import Decimal
 from functools import partial
 
 import pytest
@@ -36,6 +37,11 @@ class TestState:
             all_configs[k] == v for k, v in [("foo", 1), ("bar", "quux"), ("baz", 3)]
         )
 
+        # Nothing is written if any of the values has the wrong type
+        with pytest.raises(MismatchedTypeException):
+            state.set_configs({"foo": 5, "baz": "quux"})
+        assert state.get_config("foo") == 1
+
     @pytest.mark.redis_db
     def test_config_desc(self) -> None:
         state.set_config_description("foo", "Does foo")
@@ -133,3 +139,20 @@ def test_safe_dumps() -> None:
         {"a": 1, "b": 2},
         sort_keys=True,
     )
+
+
+def test_safe_dumps_output() -> None:
+    Point = namedtuple("Point", ["x", "y"])
+
+    class ForJson:
+        def for_json(self) -> dict[str, int]:
+            return {"a": 1}
+
+    assert safe_dumps(Decimal("1.10")) == "1.10"
+    assert safe_dumps(Point(1, 2)) == '{"x": 1, "y": 2}'
+    assert safe_dumps({None: 1, True: 2}) == '{"null": 1, "true": 2}'
+    assert safe_dumps(ForJson()) == '{"a": 1}'
+    with pytest.raises(ValueError):
+        safe_dumps(float("nan"))
+    with pytest.raises(TypeError):
+        safe_dumps(object())
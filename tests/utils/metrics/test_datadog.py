@@ -0,0 +1,37 @@
+from __future__ import annotations
+
+from datadog import DogStatsd
+
+from snuba.utils.metrics.backends.datadog import DatadogMetricsBackend
+
+
+class RecordingDogStatsd(DogStatsd):  # type: ignore
+    def __init__(self) -> None:
+        self.packets: list[str] = []
+        super().__init__()
+
+    def _send_to_server(self, packet: str) -> None:
+        self.packets.append(packet)
+
+
+def test_batch_sends_metrics_in_one_packet() -> None:
+    client = RecordingDogStatsd()
+    backend = DatadogMetricsBackend(lambda: client)
+
+    backend.increment("unbatched")
+    assert client.packets == ["unbatched:1|c"]
+
+    with backend.batch():
+        backend.increment("a")
+        with backend.batch():
+            backend.timing("b", 10)
+        assert len(client.packets) == 1
+        backend.increment("c", tags={"key": "value"})
+
+    assert client.packets == [
+        "unbatched:1|c",
+        "a:1|c\nb:10|ms\nc:1|c|#key:value",
+    ]
+
+    backend.increment("after")
+    assert client.packets[-1] == "after:1|c"
@@ -28,163 +28,97 @@ from tests.web.rpc.v1.test_endpoint_time_series.test_endpoint_time_series import
     store_spans_timeseries,
 )
 
-END_TIME = datetime.utcnow().replace(tzinfo=UTC)
+END_TIME = datetime.now(UTC)
 START_TIME = END_TIME - timedelta(hours=1)
 
 
+_META = RequestMeta(
+    project_ids=[1],
+    organization_id=1,
+    cogs_category="something",
+    referrer="something",
+    trace_item_type=TraceItemType.TRACE_ITEM_TYPE_SPAN,
+)
+_MULTI_PROJECT_META = RequestMeta(
+    project_ids=[1, 2, 3],
+    organization_id=1,
+    cogs_category="something",
+    referrer="something",
+    trace_item_type=TraceItemType.TRACE_ITEM_TYPE_SPAN,
+)
+_SUM_AGGREGATION = AttributeAggregation(
+    aggregate=Function.FUNCTION_SUM,
+    key=AttributeKey(type=AttributeKey.TYPE_FLOAT, name="test_metric"),
+    label="sum",
+    extrapolation_mode=ExtrapolationMode.EXTRAPOLATION_MODE_NONE,
+)
+
 TESTS_INVALID_RPC_SUBSCRIPTIONS = [
     pytest.param(
         CreateSubscriptionRequestProto(
             time_series_request=TimeSeriesRequest(
-                meta=RequestMeta(
-                    project_ids=[1],
-                    organization_id=1,
-                    cogs_category="something",
-                    referrer="something",
-                    trace_item_type=TraceItemType.TRACE_ITEM_TYPE_SPAN,
-                ),
-                aggregations=[
-                    AttributeAggregation(
-                        aggregate=Function.FUNCTION_SUM,
-                        key=AttributeKey(
-                            type=AttributeKey.TYPE_FLOAT, name="test_metric"
-                        ),
-                        label="sum",
-                        extrapolation_mode=ExtrapolationMode.EXTRAPOLATION_MODE_NONE,
-                    ),
-                ],
+                meta=_META, aggregations=[_SUM_AGGREGATION]
             ),
             time_window_secs=172800,
             resolution_secs=60,
-        ),
+        ).SerializeToString(),
         "Time window must be less than or equal to 24 hours",
         id="Invalid subscription: time window",
     ),
     pytest.param(
         CreateSubscriptionRequestProto(
             time_series_request=TimeSeriesRequest(
-                meta=RequestMeta(
-                    project_ids=[1, 2, 3],
-                    organization_id=1,
-                    cogs_category="something",
-                    referrer="something",
-                    trace_item_type=TraceItemType.TRACE_ITEM_TYPE_SPAN,
-                ),
-                aggregations=[
-                    AttributeAggregation(
-                        aggregate=Function.FUNCTION_SUM,
-                        key=AttributeKey(
-                            type=AttributeKey.TYPE_FLOAT, name="test_metric"
-                        ),
-                        label="sum",
-                        extrapolation_mode=ExtrapolationMode.EXTRAPOLATION_MODE_NONE,
-                    ),
-                ],
+                meta=_MULTI_PROJECT_META, aggregations=[_SUM_AGGREGATION]
             ),
             time_window_secs=300,
             resolution_secs=60,
-        ),
+        ).SerializeToString(),
         "Multiple project IDs not supported",
         id="Invalid subscription: multiple project ids",
     ),
     pytest.param(
         CreateSubscriptionRequestProto(
             time_series_request=TimeSeriesRequest(
-                meta=RequestMeta(
-                    project_ids=[1],
-                    organization_id=1,
-                    cogs_category="something",
-                    referrer="something",
-                    trace_item_type=TraceItemType.TRACE_ITEM_TYPE_SPAN,
-                ),
-                aggregations=[
-                    AttributeAggregation(
-                        aggregate=Function.FUNCTION_SUM,
-                        key=AttributeKey(
-                            type=AttributeKey.TYPE_FLOAT, name="test_metric"
-                        ),
-                        label="sum",
-                        extrapolation_mode=ExtrapolationMode.EXTRAPOLATION_MODE_NONE,
-                    ),
-                    AttributeAggregation(
-                        aggregate=Function.FUNCTION_SUM,
-                        key=AttributeKey(
-                            type=AttributeKey.TYPE_FLOAT, name="test_metric"
-                        ),
-                        label="sum",
-                        extrapolation_mode=ExtrapolationMode.EXTRAPOLATION_MODE_NONE,
-                    ),
-                ],
+                meta=_META, aggregations=[_SUM_AGGREGATION, _SUM_AGGREGATION]
             ),
             time_window_secs=300,
             resolution_secs=60,
-        ),
+        ).SerializeToString(),
         "Exactly one aggregation required",
         id="Invalid subscription: multiple aggregations",
     ),
     pytest.param(
         CreateSubscriptionRequestProto(
             time_series_request=TimeSeriesRequest(
-                meta=RequestMeta(
-                    project_ids=[1],
-                    organization_id=1,
-                    cogs_category="something",
-                    referrer="something",
-                    trace_item_type=TraceItemType.TRACE_ITEM_TYPE_SPAN,
-                ),
+                meta=_META,
                 group_by=[
                     AttributeKey(type=AttributeKey.TYPE_STRING, name="device.class")
                 ],
-                aggregations=[
-                    AttributeAggregation(
-                        aggregate=Function.FUNCTION_SUM,
-                        key=AttributeKey(
-                            type=AttributeKey.TYPE_FLOAT, name="test_metric"
-                        ),
-                        label="sum",
-                        extrapolation_mode=ExtrapolationMode.EXTRAPOLATION_MODE_NONE,
-                    ),
-                ],
+                aggregations=[_SUM_AGGREGATION],
             ),
             time_window_secs=300,
             resolution_secs=60,
-        ),
+        ).SerializeToString(),
         "Group bys not supported",
         id="Invalid subscription: group by",
     ),
     pytest.param(
         CreateSubscriptionRequestProto(
             time_series_request=TimeSeriesRequest(
-                meta=RequestMeta(
-                    project_ids=[1],
-                    organization_id=1,
-                    cogs_category="something",
-                    referrer="something",
-                    trace_item_type=TraceItemType.TRACE_ITEM_TYPE_SPAN,
-                ),
-                aggregations=[
-                    AttributeAggregation(
-                        aggregate=Function.FUNCTION_SUM,
-                        key=AttributeKey(
-                            type=AttributeKey.TYPE_FLOAT, name="test_metric"
-                        ),
-                        label="sum",
-                        extrapolation_mode=ExtrapolationMode.EXTRAPOLATION_MODE_NONE,
-                    ),
-                ],
+                meta=_META, aggregations=[_SUM_AGGREGATION]
             ),
             time_window_secs=300,
             resolution_secs=60,
-        ),
+        ).SerializeToString(),
         "Invalid extrapolation mode",
         id="Invalid subscription: extrapolation mode",
     ),
 ]
 
 
-@pytest.mark.clickhouse_db
-@pytest.mark.redis_db
 class TestCreateSubscriptionApi(BaseApiTest):
+    @pytest.mark.clickhouse_db
+    @pytest.mark.redis_db
     def test_create_valid_subscription(self) -> None:
         store_spans_timeseries(
             START_TIME,
@@ -226,13 +160,15 @@ class TestCreateSubscriptionApi(BaseApiTest):
         assert response_class.subscription_id
         partition = int(response_class.subscription_id.split("/", 1)[0])
 
-        rpc_subscription_data = list(
-            RedisSubscriptionDataStore(
-                get_redis_client(RedisClientKey.SUBSCRIPTION_STORE),
-                EntityKey("eap_spans"),
-                PartitionId(partition),
-            ).all()
-        )[0][1]
+        _, rpc_subscription_data = next(
+            iter(
+                RedisSubscriptionDataStore(
+                    get_redis_client(RedisClientKey.SUBSCRIPTION_STORE),
+                    EntityKey("eap_spans"),
+                    PartitionId(partition),
+                ).all()
+            )
+        )
 
         assert isinstance(rpc_subscription_data, RPCSubscriptionData)
 
@@ -240,27 +176,23 @@ class TestCreateSubscriptionApi(BaseApiTest):
         request_class.ParseFromString(
             base64.b64decode(rpc_subscription_data.time_series_request)
         )
+        assert request_class == message.time_series_request
         assert rpc_subscription_data.time_window_sec == 300
         assert rpc_subscription_data.resolution_sec == 60
         assert rpc_subscription_data.request_name == "TimeSeriesRequest"
         assert rpc_subscription_data.request_version == "v1"
 
     @pytest.mark.parametrize(
-        "create_subscription, error_message", TESTS_INVALID_RPC_SUBSCRIPTIONS
+        "create_subscription_bytes, error_message", TESTS_INVALID_RPC_SUBSCRIPTIONS
     )
     def test_create_invalid_subscription(
-        self, create_subscription: CreateSubscriptionRequestProto, error_message: str
+        self, create_subscription_bytes: bytes, error_message: str
     ) -> None:
-        store_spans_timeseries(
-            START_TIME,
-            1,
-            3600,
-            metrics=[DummyMetric("test_metric", get_value=lambda x: 1)],
-        )
-
+        # The subscription is rejected by validation before anything is
+        # queried or stored, so this does not need ClickHouse or Redis.
         response = self.app.post(
             "/rpc/CreateSubscriptionRequest/v1",
-            data=create_subscription.SerializeToString(),
+            data=create_subscription_bytes,
         )
         assert response.status_code == 500
         error = Error()
@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+from functools import lru_cache, partial
+from types import MappingProxyType
 from typing import Any, Mapping, MutableMapping, Optional
 from unittest import mock
 
@@ -8,9 +10,10 @@ import pytest
 from snuba import state
 from snuba.attribution.appid import AppID
 from snuba.attribution.attribution_info import AttributionInfo
+from snuba.clickhouse.columns import ColumnSet
 from snuba.clickhouse.formatter.query import format_query
 from snuba.clickhouse.query import Query as ClickhouseQuery
-from snuba.datasets.storage import Storage
+from snuba.datasets.storage import ReadableTableStorage, Storage
 from snuba.datasets.storages.factory import get_storage
 from snuba.datasets.storages.storage_key import StorageKey
 from snuba.query import SelectedExpression
@@ -32,6 +35,7 @@ from snuba.querylog.query_metadata import ClickhouseQueryMetadata
 from snuba.state.quota import ResourceQuota
 from snuba.utils.metrics.backends.testing import get_recorded_metric_calls
 from snuba.utils.metrics.timer import Timer
+from snuba.utils.metrics.wrapper import MetricsWrapper
 from snuba.web import QueryException
 from snuba.web.db_query import (
     _apply_allocation_policies_quota,
@@ -39,14 +43,18 @@ from snuba.web.db_query import (
     db_query,
 )
 
+_BASE_QUERY_CONFIG: Mapping[str, Any] = MappingProxyType(
+    {
+        "query_settings/max_threads": 10,
+        "query_settings/merge_tree_max_rows_to_use_cache": 50000,
+        "some-query-prefix/query_settings/max_threads": 5,
+        "some-query-prefix/query_settings/merge_tree_max_rows_to_use_cache": 100000,
+    }
+)
+
 test_data = [
     pytest.param(
-        {
-            "query_settings/max_threads": 10,
-            "query_settings/merge_tree_max_rows_to_use_cache": 50000,
-            "some-query-prefix/query_settings/max_threads": 5,
-            "some-query-prefix/query_settings/merge_tree_max_rows_to_use_cache": 100000,
-        },
+        _BASE_QUERY_CONFIG,
         {
             "max_threads": 10,
             "merge_tree_max_rows_to_use_cache": 50000,
@@ -57,12 +65,7 @@ test_data = [
         id="no override when query settings prefix empty",
     ),
     pytest.param(
-        {
-            "query_settings/max_threads": 10,
-            "query_settings/merge_tree_max_rows_to_use_cache": 50000,
-            "some-query-prefix/query_settings/max_threads": 5,
-            "some-query-prefix/query_settings/merge_tree_max_rows_to_use_cache": 100000,
-        },
+        _BASE_QUERY_CONFIG,
         {
             "max_threads": 10,
             "merge_tree_max_rows_to_use_cache": 50000,
@@ -73,12 +76,7 @@ test_data = [
         id="no override for different query prefix",
     ),
     pytest.param(
-        {
-            "query_settings/max_threads": 10,
-            "query_settings/merge_tree_max_rows_to_use_cache": 50000,
-            "some-query-prefix/query_settings/max_threads": 5,
-            "some-query-prefix/query_settings/merge_tree_max_rows_to_use_cache": 100000,
-        },
+        _BASE_QUERY_CONFIG,
         {
             "max_threads": 5,
             "merge_tree_max_rows_to_use_cache": 100000,
@@ -89,12 +87,7 @@ test_data = [
         id="override for same query prefix",
     ),
     pytest.param(
-        {
-            "query_settings/max_threads": 10,
-            "query_settings/merge_tree_max_rows_to_use_cache": 50000,
-            "some-query-prefix/query_settings/max_threads": 5,
-            "some-query-prefix/query_settings/merge_tree_max_rows_to_use_cache": 100000,
-        },
+        _BASE_QUERY_CONFIG,
         {
             "max_threads": 10,
             "merge_tree_max_rows_to_use_cache": 50000,
@@ -122,10 +115,7 @@ test_data = [
     ),
     pytest.param(
         {
-            "query_settings/max_threads": 10,
-            "query_settings/merge_tree_max_rows_to_use_cache": 50000,
-            "some-query-prefix/query_settings/max_threads": 5,
-            "some-query-prefix/query_settings/merge_tree_max_rows_to_use_cache": 100000,
+            **_BASE_QUERY_CONFIG,
             "async_query_settings/max_threads": 20,
         },
         {
@@ -155,10 +145,7 @@ test_data = [
     ),
     pytest.param(
         {
-            "query_settings/max_threads": 10,
-            "query_settings/merge_tree_max_rows_to_use_cache": 50000,
-            "some-query-prefix/query_settings/max_threads": 5,
-            "some-query-prefix/query_settings/merge_tree_max_rows_to_use_cache": 100000,
+            **_BASE_QUERY_CONFIG,
             "async_query_settings/max_threads": 20,
             "referrer/some-referrer/query_settings/max_threads": 30,
         },
@@ -173,10 +160,7 @@ test_data = [
     ),
     pytest.param(
         {
-            "query_settings/max_threads": 10,
-            "query_settings/merge_tree_max_rows_to_use_cache": 50000,
-            "some-query-prefix/query_settings/max_threads": 5,
-            "some-query-prefix/query_settings/merge_tree_max_rows_to_use_cache": 100000,
+            **_BASE_QUERY_CONFIG,
             "async_query_settings/max_threads": 20,
             "referrer/some-referrer/query_settings/max_threads": 30,
         },
@@ -203,23 +187,51 @@ def test_query_settings_from_config(
     async_override: bool,
     referrer: str,
 ) -> None:
-    for k, v in query_config.items():
-        state.set_config(k, v)
+    state.set_configs(query_config)
     assert (
         _get_query_settings_from_config(query_prefix, async_override, referrer=referrer)
         == expected
     )
 
 
+_db_query = partial(db_query, dataset_name="events", trace_id="trace_id", robust=False)
+
+# Expressions are immutable, so a parsed expression can be shared by tests.
+_parse_expression = lru_cache(maxsize=32)(parse_clickhouse_function)
+
+
+@lru_cache(maxsize=1)
+def _errors_ro_storage() -> tuple[ReadableTableStorage, str, ColumnSet]:
+    storage = get_storage(StorageKey("errors_ro"))
+    schema = storage.get_schema()
+    return (
+        storage,
+        schema.get_data_source().get_table_name(),  # type: ignore
+        schema.get_columns(),
+    )
+
+
+# AttributionInfo is frozen and db_query does not modify its tenant_ids, so
+# every test query can share one.
+_DEFAULT_ATTRIBUTION_INFO = AttributionInfo(
+    app_id=AppID(key="key"),
+    tenant_ids={"referrer": "something", "organization_id": 1234},
+    referrer="something",
+    team=None,
+    feature=None,
+    parent_api=None,
+)
+
+
 def _build_test_query(
     select_expression: str, allocation_policies: list[AllocationPolicy] | None = None
 ) -> tuple[ClickhouseQuery, Storage, AttributionInfo]:
-    storage = get_storage(StorageKey("errors_ro"))
+    storage, table_name, columns = _errors_ro_storage()
     return (
         ClickhouseQuery(
             from_clause=Table(
-                storage.get_schema().get_data_source().get_table_name(),  # type: ignore
-                schema=storage.get_schema().get_columns(),
+                table_name,
+                schema=columns,
                 final=False,
                 allocation_policies=allocation_policies
                 or storage.get_allocation_policies(),
@@ -228,19 +240,12 @@ def _build_test_query(
             selected_columns=[
                 SelectedExpression(
                     "some_alias",
-                    parse_clickhouse_function(select_expression),
+                    _parse_expression(select_expression),
                 )
             ],
         ),
         storage,
-        AttributionInfo(
-            app_id=AppID(key="key"),
-            tenant_ids={"referrer": "something", "organization_id": 1234},
-            referrer="something",
-            team=None,
-            feature=None,
-            parent_api=None,
-        ),
+        _DEFAULT_ATTRIBUTION_INFO,
     )
 
 
@@ -257,7 +262,7 @@ def test_db_record_bytes_scanned() -> None:
     query_metadata_list: list[ClickhouseQueryMetadata] = []
     stats: dict[str, Any] = {}
 
-    db_query(
+    _db_query(
         clickhouse_query=query,
         query_settings=HTTPQuerySettings(),
         attribution_info=attribution_info,
@@ -267,8 +272,6 @@ def test_db_record_bytes_scanned() -> None:
         reader=storage.get_cluster().get_reader(),
         timer=Timer("foo"),
         stats=stats,
-        trace_id="trace_id",
-        robust=False,
     )
 
     metrics = get_recorded_metric_calls("increment", "allocation_policy.bytes_scanned")
@@ -289,18 +292,15 @@ def test_db_query_success() -> None:
     query_metadata_list: list[ClickhouseQueryMetadata] = []
     stats: dict[str, Any] = {}
 
-    result = db_query(
+    result = _db_query(
         clickhouse_query=query,
         query_settings=HTTPQuerySettings(),
         attribution_info=attribution_info,
-        dataset_name="events",
         query_metadata_list=query_metadata_list,
         formatted_query=format_query(query),
         reader=storage.get_cluster().get_reader(),
         timer=Timer("foo"),
         stats=stats,
-        trace_id="trace_id",
-        robust=False,
     )
 
     assert stats["quota_allowance"] == {
@@ -428,18 +428,15 @@ def test_bypass_cache_referrer() -> None:
         "snuba.settings.BYPASS_CACHE_REFERRERS", ["some_bypass_cache_referrer"]
     ):
         with mock.patch("snuba.web.db_query._get_cache_partition"):
-            result = db_query(
+            result = _db_query(
                 clickhouse_query=query,
                 query_settings=HTTPQuerySettings(),
                 attribution_info=attribution_info,
-                dataset_name="events",
                 query_metadata_list=query_metadata_list,
                 formatted_query=format_query(query),
                 reader=storage.get_cluster().get_reader(),
                 timer=Timer("foo"),
                 stats=stats,
-                trace_id="trace_id",
-                robust=False,
             )
             assert len(query_metadata_list) == 1
             assert result.extra["stats"] == stats
@@ -461,18 +458,15 @@ def test_db_query_fail() -> None:
     query_metadata_list: list[ClickhouseQueryMetadata] = []
     stats: dict[str, Any] = {}
     with pytest.raises(QueryException) as excinfo:
-        db_query(
+        _db_query(
             clickhouse_query=query,
             query_settings=HTTPQuerySettings(),
             attribution_info=attribution_info,
-            dataset_name="events",
             query_metadata_list=query_metadata_list,
             formatted_query=format_query(query),
             reader=storage.get_cluster().get_reader(),
             timer=Timer("foo"),
             stats=stats,
-            trace_id="trace_id",
-            robust=False,
         )
 
     assert len(query_metadata_list) == 1
@@ -646,18 +640,15 @@ def test_db_query_with_rejecting_allocation_policy() -> None:
         query_metadata_list: list[ClickhouseQueryMetadata] = []
         stats: dict[str, Any] = {}
         with pytest.raises(QueryException) as excinfo:
-            db_query(
+            _db_query(
                 clickhouse_query=query,
                 query_settings=HTTPQuerySettings(),
                 attribution_info=mock.Mock(),
-                dataset_name="events",
                 query_metadata_list=query_metadata_list,
                 formatted_query=format_query(query),
                 reader=mock.Mock(),
                 timer=Timer("foo"),
                 stats=stats,
-                trace_id="trace_id",
-                robust=False,
             )
         assert stats["quota_allowance"] == {
             "summary": {
@@ -778,67 +769,28 @@ def test_allocation_policy_threads_applied_to_query() -> None:
     stats: dict[str, Any] = {}
     settings = HTTPQuerySettings()
     settings.set_resource_quota(ResourceQuota(max_threads=420))
-    db_query(
+    _db_query(
         clickhouse_query=query,
         query_settings=settings,
         attribution_info=attribution_info,
-        dataset_name="events",
         query_metadata_list=query_metadata_list,
         formatted_query=format_query(query),
         reader=storage.get_cluster().get_reader(),
         timer=Timer("foo"),
         stats=stats,
-        trace_id="trace_id",
-        robust=False,
     )
     assert settings.get_resource_quota().max_threads == POLICY_THREADS  # type: ignore
     assert stats["max_threads"] == POLICY_THREADS
     assert query_metadata_list[0].stats["max_threads"] == POLICY_THREADS
 
 
-@pytest.mark.clickhouse_db
 @pytest.mark.redis_db
 def test_allocation_policy_updates_quota() -> None:
     MAX_QUERIES_TO_RUN = 2
 
-    queries_run = 0
-
     class CountQueryPolicy(AllocationPolicy):
-        def _additional_config_definitions(self) -> list[AllocationPolicyConfig]:
-            return []
+        queries_run = 0
 
-        def _get_quota_allowance(
-            self, tenant_ids: dict[str, str | int], query_id: str
-        ) -> QuotaAllowance:
-            can_run = True
-            suggestion = NO_SUGGESTION
-            if queries_run + 1 > MAX_QUERIES_TO_RUN:
-                can_run = False
-                suggestion = "scan less concurrent queries"
-            return QuotaAllowance(
-                can_run=can_run,
-                max_threads=0,
-                explanation={"reason": f"can only run {queries_run} queries!"},
-                is_throttled=False,
-                throttle_threshold=MAX_QUERIES_TO_RUN,
-                rejection_threshold=MAX_QUERIES_TO_RUN,
-                quota_used=queries_run + 1,
-                quota_unit="queries",
-                suggestion=suggestion,
-            )
-
-        def _update_quota_balance(
-            self,
-            tenant_ids: dict[str, str | int],
-            query_id: str,
-            result_or_error: QueryResultOrError,
-        ) -> None:
-            nonlocal queries_run
-            queries_run += 1
-
-    queries_run_duplicate = 0
-
-    class CountQueryPolicyDuplicate(AllocationPolicy):
         def _additional_config_definitions(self) -> list[AllocationPolicyConfig]:
             return []
 
@@ -847,20 +799,17 @@ def test_allocation_policy_updates_quota() -> None:
         ) -> QuotaAllowance:
             can_run = True
             suggestion = NO_SUGGESTION
-            if queries_run_duplicate + 1 > MAX_QUERIES_TO_RUN:
+            if self.queries_run + 1 > MAX_QUERIES_TO_RUN:
                 can_run = False
                 suggestion = "scan less concurrent queries"
-
             return QuotaAllowance(
                 can_run=can_run,
                 max_threads=0,
-                explanation={
-                    "reason": f"can only run {queries_run_duplicate} queries!"
-                },
+                explanation={"reason": f"can only run {self.queries_run} queries!"},
                 is_throttled=False,
                 throttle_threshold=MAX_QUERIES_TO_RUN,
                 rejection_threshold=MAX_QUERIES_TO_RUN,
-                quota_used=queries_run + 1,
+                quota_used=self.queries_run + 1,
                 quota_unit="queries",
                 suggestion=suggestion,
             )
@@ -871,34 +820,41 @@ def test_allocation_policy_updates_quota() -> None:
             query_id: str,
             result_or_error: QueryResultOrError,
         ) -> None:
-            nonlocal queries_run_duplicate
-            queries_run_duplicate += 1
+            self.queries_run += 1
+
+    class CountQueryPolicyDuplicate(CountQueryPolicy):
+        pass
 
+    count_policy = CountQueryPolicy(StorageKey("doesntmatter"), ["a", "b", "c"], {})
     # the first policy will error and short circuit the rest
-    query, storage, attribution_info = _build_test_query(
+    query, _, attribution_info = _build_test_query(
         "count(distinct(project_id))",
         [
-            CountQueryPolicy(StorageKey("doesntmatter"), ["a", "b", "c"], {}),
+            count_policy,
             CountQueryPolicyDuplicate(StorageKey("doesntmatter"), ["a", "b", "c"], {}),
         ],
     )
 
+    # only the policies are under test here, so the query never has to
+    # reach ClickHouse
+    reader = mock.MagicMock()
+    reader.cache_partition_id = None
+    reader.get_query_settings_prefix.return_value = None
+    reader.execute.return_value = {"data": [], "meta": [], "profile": {}}
+
     def _run_query() -> None:
         query_metadata_list: list[ClickhouseQueryMetadata] = []
         stats: dict[str, Any] = {}
         settings = HTTPQuerySettings()
-        db_query(
+        _db_query(
             clickhouse_query=query,
             query_settings=settings,
             attribution_info=attribution_info,
-            dataset_name="events",
             query_metadata_list=query_metadata_list,
             formatted_query=format_query(query),
-            reader=storage.get_cluster().get_reader(),
+            reader=reader,
             timer=Timer("foo"),
             stats=stats,
-            trace_id="trace_id",
-            robust=False,
         )
 
     for _ in range(MAX_QUERIES_TO_RUN):
@@ -917,7 +873,7 @@ def test_allocation_policy_updates_quota() -> None:
             "rejected_by": {
                 "policy": "CountQueryPolicy",
                 "rejection_threshold": MAX_QUERIES_TO_RUN,
-                "quota_used": queries_run,
+                "quota_used": count_policy.queries_run,
                 "quota_unit": "queries",
                 "suggestion": "scan less concurrent queries",
                 "storage_key": "StorageKey.DOESNTMATTER",
@@ -935,7 +891,7 @@ def test_allocation_policy_updates_quota() -> None:
                 "is_throttled": False,
                 "throttle_threshold": MAX_QUERIES_TO_RUN,
                 "rejection_threshold": MAX_QUERIES_TO_RUN,
-                "quota_used": queries_run,
+                "quota_used": count_policy.queries_run,
                 "quota_unit": "queries",
                 "suggestion": "scan less concurrent queries",
             },
@@ -966,18 +922,15 @@ def test_clickhouse_settings_applied_to_query() -> None:
     reader.execute.return_value = result
     result.get.return_value.get.return_value = 0
 
-    db_query(
+    _db_query(
         clickhouse_query=query,
         query_settings=settings,
         attribution_info=attribution_info,
-        dataset_name="events",
         query_metadata_list=query_metadata_list,
         formatted_query=format_query(query),
         reader=reader,
         timer=Timer("foo"),
         stats=stats,
-        trace_id="trace_id",
-        robust=False,
     )
 
     clickhouse_settings_used = reader.execute.call_args.args[1]
@@ -1000,18 +953,15 @@ def test_db_query_ignore_consistent() -> None:
     query_metadata_list: list[ClickhouseQueryMetadata] = []
     stats: dict[str, Any] = {}
 
-    result = db_query(
+    result = _db_query(
         clickhouse_query=query,
         query_settings=HTTPQuerySettings(consistent=True),
         attribution_info=attribution_info,
-        dataset_name="events",
         query_metadata_list=query_metadata_list,
         formatted_query=format_query(query),
         reader=storage.get_cluster().get_reader(),
         timer=Timer("foo"),
         stats=stats,
-        trace_id="trace_id",
-        robust=False,
     )
     assert result.extra["stats"]["consistent"] is False
     assert result.extra["stats"]["max_threads"] == 10
@@ -1021,27 +971,31 @@ def test_db_query_ignore_consistent() -> None:
 @pytest.mark.redis_db
 def test_cache_metrics_with_simple_readthrough() -> None:
     query, storage, attribution_info = _build_test_query("count(distinct(project_id))")
-    state.set_config("disable_lua_randomize_query_id", 1)
-    state.set_config("read_through_cache.disable_lua_scripts_sample_rate", 1)
+    state.set_configs(
+        {
+            "disable_lua_randomize_query_id": 1,
+            "read_through_cache.disable_lua_scripts_sample_rate": 1,
+        }
+    )
 
     formatted_query = format_query(query)
     reader = storage.get_cluster().get_reader()
 
-    with mock.patch("snuba.web.db_query.metrics", new=mock.Mock()) as metrics_mock:
-        result = db_query(
+    stats: dict[str, Any] = {}
+    with mock.patch(
+        "snuba.web.db_query.metrics", new=mock.Mock(spec=MetricsWrapper)
+    ) as metrics_mock:
+        _db_query(
             clickhouse_query=query,
             query_settings=HTTPQuerySettings(),
             attribution_info=attribution_info,
-            dataset_name="events",
             query_metadata_list=[],
             formatted_query=formatted_query,
             reader=reader,
             timer=Timer("foo"),
-            stats={},
-            trace_id="trace_id",
-            robust=False,
+            stats=stats,
         )
-        assert "cache_hit_simple" in result.extra["stats"]
+        assert "cache_hit_simple" in stats
         # Assert on first call cache_miss is incremented
         metrics_mock.assert_has_calls(
             [
@@ -1051,20 +1005,22 @@ def test_cache_metrics_with_simple_readthrough() -> None:
         )
 
         metrics_mock.reset_mock()
-        result = db_query(
-            clickhouse_query=query,
-            query_settings=HTTPQuerySettings(),
-            attribution_info=attribution_info,
-            dataset_name="events",
-            query_metadata_list=[],
-            formatted_query=formatted_query,
-            reader=reader,
-            timer=Timer("foo"),
-            stats={},
-            trace_id="trace_id",
-            robust=False,
-        )
-        assert "cache_hit_simple" in result.extra["stats"]
+        stats = {}
+        # the result must now be served from the cache without querying ClickHouse
+        with mock.patch.object(
+            reader, "execute", side_effect=AssertionError("cache should serve hit")
+        ):
+            _db_query(
+                clickhouse_query=query,
+                query_settings=HTTPQuerySettings(),
+                attribution_info=attribution_info,
+                query_metadata_list=[],
+                formatted_query=formatted_query,
+                reader=reader,
+                timer=Timer("foo"),
+                stats=stats,
+            )
+        assert "cache_hit_simple" in stats
         # Assert on second call cache_hit is incremented
         metrics_mock.assert_has_calls(
             [